@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Background queue for AI analyses.
+
+POST /ai-analysis/jobs stores a pending row in ai_jobs and returns at once;
+workers claim pending rows, run the analysis and record the AIAnalysis id. A
+job is claimed with a conditional UPDATE, so any number of workers, in the
+API process or in separate ones, can share the table safely.
+
+- An identical job (same user and analysis type) that is still pending or
+  running is returned instead of queueing a second one.
+- Failed attempts are retried up to AI_JOB_MAX_ATTEMPTS times with
+  exponential backoff from AI_JOB_RETRY_SECONDS.
+- A job left running for AI_JOB_LEASE_SECONDS (e.g. its worker died) is
+  picked up again.
+
+The API starts AI_JOB_WORKERS workers on startup. To process jobs in a
+separate process instead, set AI_JOB_WORKERS=0 for the API and run:
+    python ai_jobs.py [--workers 4]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analysis import run_analysis
+from database import AsyncSessionLocal
+from models import AIJob
+
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "2"))
+AI_JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3"))
+AI_JOB_RETRY_SECONDS = float(os.getenv("AI_JOB_RETRY_SECONDS", "5"))
+AI_JOB_LEASE_SECONDS = float(os.getenv("AI_JOB_LEASE_SECONDS", "300"))
+AI_JOB_POLL_SECONDS = float(os.getenv("AI_JOB_POLL_SECONDS", "2"))
+
+ACTIVE_STATUSES = ("pending", "running")
+
+# Set on enqueue so in-process workers start without waiting for the next poll.
+# Each worker creates its own event, since an event is bound to the loop that
+# first waits on it.
+_job_events: Set[asyncio.Event] = set()
+
+async def enqueue_analysis(db: AsyncSession, user_id: int, analysis_type: str) -> AIJob:
+    """Queue an analysis, or return the identical job that is already queued or running"""
+    existing = (await db.execute(
+        select(AIJob).where(
+            AIJob.user_id == user_id,
+            AIJob.analysis_type == analysis_type,
+            AIJob.status.in_(ACTIVE_STATUSES),
+        ).order_by(AIJob.job_id).limit(1)
+    )).scalars().first()
+    # See claim_job; a job queued in between is caught by ux_ai_jobs_active below
+    await db.commit()
+    if existing is not None:
+        return existing
+
+    now = datetime.utcnow()
+    job = AIJob(user_id=user_id, analysis_type=analysis_type, status="pending", attempts=0, run_after=now, updated_at=now)
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request queued the same job first (ux_ai_jobs_active)
+        await db.rollback()
+        return await enqueue_analysis(db, user_id, analysis_type)
+    await db.refresh(job)
+    for job_added in _job_events:
+        job_added.set()
+    return job
+
+async def claim_job(db: AsyncSession) -> Optional[AIJob]:
+    """Mark the oldest runnable job as running and return it, or None if there is none"""
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(AIJob.status == "pending", AIJob.run_after <= now),
+        and_(AIJob.status == "running", AIJob.updated_at < now - timedelta(seconds=AI_JOB_LEASE_SECONDS)),
+    )
+    while True:
+        candidate = (await db.execute(
+            select(AIJob.job_id, AIJob.status, AIJob.updated_at).where(runnable).order_by(AIJob.job_id).limit(1)
+        )).first()
+        # End the read transaction first: upgrading a SQLite read snapshot that
+        # another worker has since written to fails at once with "database is locked"
+        await db.commit()
+        if candidate is None:
+            return None
+        job_id, status, updated_at = candidate
+        # Only succeeds if no other worker claimed the row since it was read
+        claimed = await db.execute(
+            update(AIJob)
+            .where(AIJob.job_id == job_id, AIJob.status == status, AIJob.updated_at == updated_at)
+            .values(status="running", attempts=AIJob.attempts + 1, updated_at=now)
+        )
+        await db.commit()
+        if claimed.rowcount == 1:
+            return await db.get(AIJob, job_id)
+
+async def process_job(job: AIJob):
+    """Run one claimed job and record the outcome"""
+    async with AsyncSessionLocal() as db:
+        try:
+            analysis = await run_analysis(db, job.user_id, job.analysis_type, save_failures=False)
+            await db.commit()  # Ends the read left open by run_analysis; see claim_job
+            values = {"status": "succeeded", "analysis_id": analysis.analysis_id, "error": None}
+        except Exception as e:
+            await db.rollback()
+            if job.attempts < AI_JOB_MAX_ATTEMPTS:
+                delay = AI_JOB_RETRY_SECONDS * 2 ** (job.attempts - 1)
+                values = {"status": "pending", "error": str(e), "run_after": datetime.utcnow() + timedelta(seconds=delay)}
+            else:
+                values = {"status": "failed", "error": str(e)}
+            print(f"❌ AI job {job.job_id} attempt {job.attempts} failed: {e}")
+        await db.execute(update(AIJob).where(AIJob.job_id == job.job_id).values(updated_at=datetime.utcnow(), **values))
+        await db.commit()
+
+async def worker():
+    job_added = asyncio.Event()
+    _job_events.add(job_added)
+    try:
+        while True:
+            # Cleared before looking, so a job queued meanwhile still wakes us below
+            job_added.clear()
+            try:
+                async with AsyncSessionLocal() as db:
+                    job = await claim_job(db)
+                if job is not None:
+                    await process_job(job)
+                    continue
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(job_added.wait(), AI_JOB_POLL_SECONDS)
+            except Exception as e:
+                # e.g. the database is briefly locked; the job's lease lets it be retried
+                print(f"❌ AI job worker error: {e}")
+                await asyncio.sleep(AI_JOB_POLL_SECONDS)
+    finally:
+        _job_events.discard(job_added)
+
+def start_workers(count: int = AI_JOB_WORKERS) -> List[asyncio.Task]:
+    return [asyncio.create_task(worker(), name=f"ai-job-worker-{i}") for i in range(count)]
+
+async def stop_workers(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued AI analysis jobs")
+    parser.add_argument("--workers", type=int, default=max(AI_JOB_WORKERS, 1))
+    args = parser.parse_args()
+
+    async def main():
+        print(f"🤖 Processing AI jobs with {args.workers} workers (Ctrl+C to stop)")
+        await asyncio.gather(*start_workers(args.workers))
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,13 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 from typing import List, Optional
 import json
 from datetime import datetime
 
+import llm_client
+from llm_client import LLMRejectedError, LLMTimeoutError
+from money import from_minor, to_minor
+
 # Load environment variables
 load_dotenv()
 
@@ -13,14 +16,25 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY not found in environment variables. AI analysis will not work.")
 else:
-    genai.configure(api_key=GEMINI_API_KEY)
+    llm_client.configure(GEMINI_API_KEY)
+
+# Fallback messages returned in place of a response when Gemini fails
+ERROR_PREFIXES = (
+    "AI analysis unavailable",
+    "Error generating insights",
+    "AI chatbot unavailable",
+    "I'm sorry, I couldn't process",
+)
+
+def is_error_response(text: str) -> bool:
+    return text.startswith(ERROR_PREFIXES)
 
 def prepare_transaction_data(transactions):
     """Convert transaction objects to a format suitable for Gemini API"""
     transaction_data = []
     for tx in transactions:
         transaction_data.append({
-            "amount": tx.amount,
+            "amount": from_minor(tx.amount_minor, tx.currency),
             "category": tx.category,
             "description": tx.description,
             "date": tx.date.strftime("%Y-%m-%d"),
@@ -34,7 +48,7 @@ def prepare_budget_data(budget):
         return None
     
     return {
-        "monthly_budget": budget.monthly_budget,
+        "monthly_budget": from_minor(budget.monthly_budget_minor, budget.currency),
         "start_date": budget.start_date.strftime("%Y-%m-%d"),
         "end_date": budget.end_date.strftime("%Y-%m-%d")
     }
@@ -45,39 +59,54 @@ def prepare_savings_goals_data(savings_goals):
     for goal in savings_goals:
         goals_data.append({
             "goal_name": goal.goal_name,
-            "target_amount": goal.target_amount,
-            "current_amount": goal.current_amount,
+            "target_amount": from_minor(goal.target_amount_minor, goal.currency),
+            "current_amount": from_minor(goal.current_amount_minor, goal.currency),
             "deadline": goal.deadline.strftime("%Y-%m-%d"),
-            "progress_percentage": (goal.current_amount / goal.target_amount) * 100 if goal.target_amount > 0 else 0
+            "progress_percentage": (goal.current_amount_minor / goal.target_amount_minor) * 100 if goal.target_amount_minor > 0 else 0
         })
     return goals_data
 
-def generate_financial_insights(transactions, budget, savings_goals, analysis_type="general"):
+def calculate_totals(tx_data):
+    """Compute total spent, total income and net amount per category from prepared transactions"""
+    # Summed in minor units so the totals are exact
+    amounts = [(tx["category"], to_minor(tx["amount"])) for tx in tx_data]
+    total_spent = sum(amount for _, amount in amounts if amount < 0)
+    total_income = sum(amount for _, amount in amounts if amount > 0)
+    categories = {}
+    for cat, amount in amounts:
+        categories[cat] = categories.get(cat, 0) + amount
+    return {
+        "total_spent": from_minor(total_spent),
+        "total_income": from_minor(total_income),
+        "categories": {cat: from_minor(amount) for cat, amount in categories.items()},
+    }
+
+async def generate_financial_insights(transactions, budget, savings_goals, analysis_type="general", totals=None, context=None):
     """Generate financial insights using Gemini API"""
     if not GEMINI_API_KEY or GEMINI_API_KEY == "your_gemini_api_key_here":
         print("Error: GEMINI_API_KEY not found or invalid. AI analysis will not work.")
         return "AI analysis unavailable: The API key may be invalid or missing. Please contact support."
     
-    # Prepare data for Gemini API
-    tx_data = prepare_transaction_data(transactions)
+    # Prepare data for Gemini API; prefer the compact context from prompt_context
+    # over the full transaction list when the caller has it
     budget_data = prepare_budget_data(budget)
     goals_data = prepare_savings_goals_data(savings_goals)
+    if context is None or totals is None:
+        tx_data = prepare_transaction_data(transactions)
+    tx_text = context if context is not None else json.dumps(tx_data)
     
-    # Calculate some basic statistics
-    total_spent = sum(tx["amount"] for tx in tx_data if tx["amount"] < 0)
-    total_income = sum(tx["amount"] for tx in tx_data if tx["amount"] > 0)
-    categories = {}
-    for tx in tx_data:
-        cat = tx["category"]
-        if cat not in categories:
-            categories[cat] = 0
-        categories[cat] += tx["amount"]
+    # Use precomputed rollup totals when the caller has them
+    if totals is None:
+        totals = calculate_totals(tx_data)
+    total_spent = totals["total_spent"]
+    total_income = totals["total_income"]
+    categories = totals["categories"]
     
     # Create prompt based on analysis type
     prompts = {
         "general": f"""Analyze this financial data and provide 3-5 actionable insights:
         
-Transactions: {json.dumps(tx_data)}
+Transactions: {tx_text}
 Budget: {json.dumps(budget_data)}
 Savings Goals: {json.dumps(goals_data)}
 
@@ -96,7 +125,7 @@ Make sure insights are specific with actual numbers and percentages.""",
         
         "budget": f"""Analyze this budget data and provide 3-5 actionable insights about budget management:
         
-Transactions: {json.dumps(tx_data)}
+Transactions: {tx_text}
 Budget: {json.dumps(budget_data)}
 
 Total spent: {total_spent}
@@ -114,7 +143,7 @@ Make insights specific with actual rupee amounts.""",
         "savings": f"""Analyze these savings goals and provide 3-5 actionable insights:
         
 Savings Goals: {json.dumps(goals_data)}
-Transactions: {json.dumps(tx_data)}
+Transactions: {tx_text}
 
 Total spent: {total_spent}
 Total income: {total_income}
@@ -132,13 +161,13 @@ Make insights specific with actual rupee amounts and timeframes.""",
     prompt = prompts.get(analysis_type, prompts["general"])
     
     try:
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Generate response
-        response = model.generate_content(prompt)
-        
-        return response.text
+        # Generate response off the event loop
+        return await llm_client.generate(prompt)
+    except LLMRejectedError:
+        raise
+    except LLMTimeoutError as e:
+        print(f"Error generating insights: {e}")
+        return "AI analysis unavailable: The AI service took too long to respond. Please try again later."
     except Exception as e:
         error_message = str(e)
         print(f"Error generating insights: {error_message}")
@@ -198,26 +227,22 @@ EXAMPLE_PROMPTS = {
     "savings": "Analyze these savings goals and provide 3-5 actionable insights..."
 }
 
-def process_chat_message(user_message: str, transactions, budget, savings_goals):
-    """Process a chat message from the user and generate a response using Gemini API"""
-    if not GEMINI_API_KEY or GEMINI_API_KEY == "your_gemini_api_key_here":
-        print("Error: GEMINI_API_KEY not found or invalid. Chat functionality will not work.")
-        return "AI chatbot unavailable: The API key may be invalid or missing. Please contact support."
-    
-    # Prepare data for Gemini API
-    tx_data = prepare_transaction_data(transactions)
+def build_chat_prompt(user_message: str, transactions, budget, savings_goals, totals=None, context=None, history=None) -> str:
+    """Build the chat prompt from the user's question, financial data and earlier conversation"""
+    # Prepare data for Gemini API; prefer the compact context from prompt_context
+    # over the full transaction list when the caller has it
     budget_data = prepare_budget_data(budget)
     goals_data = prepare_savings_goals_data(savings_goals)
+    if context is None or totals is None:
+        tx_data = prepare_transaction_data(transactions)
+    tx_text = context if context is not None else json.dumps(tx_data)
     
-    # Calculate some basic statistics
-    total_spent = sum(tx["amount"] for tx in tx_data if tx["amount"] < 0)
-    total_income = sum(tx["amount"] for tx in tx_data if tx["amount"] > 0)
-    categories = {}
-    for tx in tx_data:
-        cat = tx["category"]
-        if cat not in categories:
-            categories[cat] = 0
-        categories[cat] += tx["amount"]
+    # Use precomputed rollup totals when the caller has them
+    if totals is None:
+        totals = calculate_totals(tx_data)
+    total_spent = totals["total_spent"]
+    total_income = totals["total_income"]
+    categories = totals["categories"]
     
     # Days left logic for budget period (assume month if dates exist)
     days_left = None
@@ -236,12 +261,18 @@ def process_chat_message(user_message: str, transactions, budget, savings_goals)
         except Exception:
             pass
 
+    # Earlier turns let follow-up questions refer back to them
+    history_text = f"""
+    CONVERSATION SO FAR (use it to understand follow-up questions)
+{history}
+""" if history else ""
+
     # Create prompt for chat with smarter guidance
     prompt = f"""You are a senior financial planner inside the FlexiFi Budget App.
     Always use the user's data below to answer with clear, numeric guidance.
 
     DATA
-    - Transactions: {json.dumps(tx_data)}
+    - Transactions: {tx_text}
     - Budget: {json.dumps(budget_data)}
     - Savings Goals: {json.dumps(goals_data)}
     - Total spent (negative): {total_spent}
@@ -263,25 +294,82 @@ def process_chat_message(user_message: str, transactions, budget, savings_goals)
     3) For general questions, provide 2-3 short, specific recommendations with amounts/percentages.
 
     Respond concisely (3-6 sentences) and include rupee symbols and exact numbers where relevant.
-
+{history_text}
     USER QUESTION: {user_message}
     """
+    return prompt
+
+def build_summary_prompt(previous_summary: Optional[str], conversation: str, max_words: int) -> str:
+    """Prompt asking Gemini to fold new chat messages into the running summary"""
+    return f"""You maintain a running summary of a conversation between a user and the FlexiFi Budget App's financial assistant.
+    Update the summary with the new messages below. Keep facts the user shared (amounts, plans, purchases, goals),
+    the questions they asked and the advice and numbers given. Drop greetings and repetition.
+    Reply with the updated summary only, in at most {max_words} words.
+
+    CURRENT SUMMARY: {previous_summary or "(none yet)"}
+
+    NEW MESSAGES
+{conversation}
+    """
+
+async def summarize_chat(previous_summary: Optional[str], conversation: str, max_words: int) -> Optional[str]:
+    """Updated conversation summary, or None if Gemini could not produce one"""
+    if not _chat_available():
+        return None
+    try:
+        summary = await llm_client.generate(build_summary_prompt(previous_summary, conversation, max_words))
+    except Exception as e:
+        print(f"Error summarizing chat: {e}")
+        return None
+    return summary.strip() or None
+
+CHAT_UNAVAILABLE = "AI chatbot unavailable: The API key may be invalid or missing. Please contact support."
+
+def _chat_error_response(e: Exception) -> str:
+    """User-facing message for a failed chat call"""
+    error_message = str(e)
+    print(f"Error processing chat message: {error_message}")
+    
+    if isinstance(e, LLMTimeoutError):
+        return "AI chatbot unavailable: The AI service took too long to respond. Please try again later."
+    elif "API key" in error_message or "authentication" in error_message.lower():
+        return "AI chatbot unavailable: API key invalid or expired. Please contact support."
+    elif "quota" in error_message.lower() or "rate limit" in error_message.lower():
+        return "AI chatbot unavailable: API quota exceeded. Please try again later or contact support."
+    else:
+        return f"I'm sorry, I couldn't process your question. Please try again later or contact support."
+
+def _chat_available() -> bool:
+    if not GEMINI_API_KEY or GEMINI_API_KEY == "your_gemini_api_key_here":
+        print("Error: GEMINI_API_KEY not found or invalid. Chat functionality will not work.")
+        return False
+    return True
+
+async def process_chat_message(user_message: str, transactions, budget, savings_goals, totals=None, context=None, history=None):
+    """Process a chat message from the user and generate a response using Gemini API"""
+    if not _chat_available():
+        return CHAT_UNAVAILABLE
     
+    prompt = build_chat_prompt(user_message, transactions, budget, savings_goals, totals, context, history)
     try:
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Generate response
-        response = model.generate_content(prompt)
-        
-        return response.text
+        # Generate response off the event loop
+        return await llm_client.generate(prompt)
+    except LLMRejectedError:
+        raise
     except Exception as e:
-        error_message = str(e)
-        print(f"Error processing chat message: {error_message}")
-        
-        if "API key" in error_message or "authentication" in error_message.lower():
-            return "AI chatbot unavailable: API key invalid or expired. Please contact support."
-        elif "quota" in error_message.lower() or "rate limit" in error_message.lower():
-            return "AI chatbot unavailable: API quota exceeded. Please try again later or contact support."
-        else:
-            return f"I'm sorry, I couldn't process your question. Please try again later or contact support."
\ No newline at end of file
+        return _chat_error_response(e)
+
+async def stream_chat_message(user_message: str, transactions, budget, savings_goals, totals=None, context=None, history=None):
+    """Like process_chat_message, but yields the response in pieces as Gemini generates it"""
+    if not _chat_available():
+        yield CHAT_UNAVAILABLE
+        return
+    
+    prompt = build_chat_prompt(user_message, transactions, budget, savings_goals, totals, context, history)
+    try:
+        async for piece in llm_client.stream(prompt):
+            yield piece
+    except LLMRejectedError:
+        raise
+    except Exception as e:
+        yield _chat_error_response(e)
\ No newline at end of file
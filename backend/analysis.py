@@ -0,0 +1,131 @@
+"""
+Generation of AIAnalysis rows, shared by the API endpoint and the job workers.
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ai_service import generate_financial_insights, is_error_response
+from llm_client import LLMRejectedError
+from insights_cache import AI_CACHE_TTL_SECONDS, data_fingerprint, insights_cache
+from models import AIAnalysis, Budget, SavingsGoal
+from prompt_context import build_prompt_context
+from rollups import get_spending_totals
+
+class AnalysisFailed(Exception):
+    """Gemini returned a fallback message instead of an analysis"""
+
+async def find_current_analysis(db: AsyncSession, user_id: int, analysis_type: str, fingerprint: str) -> Optional[AIAnalysis]:
+    """Latest analysis built from data matching fingerprint, from the cache or the table.
+
+    The table lookup finds analyses made by other workers or by precompute.py.
+    Analyses older than AI_CACHE_TTL_SECONDS are not reused, even if the data
+    is unchanged, since their advice is about the period they were made in.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=AI_CACHE_TTL_SECONDS)
+    cache_key = (user_id, analysis_type, fingerprint)
+    analysis_id = insights_cache.get(cache_key)
+    if analysis_id is not None:
+        cached = await db.get(AIAnalysis, analysis_id)
+        if cached is not None and cached.created_at >= cutoff:
+            return cached
+    stored = (await db.execute(
+        select(AIAnalysis).where(
+            AIAnalysis.user_id == user_id,
+            AIAnalysis.analysis_type == analysis_type,
+            AIAnalysis.data_fingerprint == fingerprint,
+            AIAnalysis.created_at >= cutoff,
+        ).order_by(AIAnalysis.analysis_id.desc()).limit(1)
+    )).scalars().first()
+    if stored is not None:
+        insights_cache.set(cache_key, stored.analysis_id)
+    return stored
+
+async def latest_analysis(db: AsyncSession, user_id: int, analysis_type: str) -> Optional[AIAnalysis]:
+    """The user's most recent successful analysis of this type, whatever data it was built from"""
+    return (await db.execute(
+        select(AIAnalysis).where(
+            AIAnalysis.user_id == user_id,
+            AIAnalysis.analysis_type == analysis_type,
+            AIAnalysis.data_fingerprint.isnot(None),
+        ).order_by(AIAnalysis.analysis_id.desc()).limit(1)
+    )).scalars().first()
+
+async def run_analysis(db: AsyncSession, user_id: int, analysis_type: str, save_failures: bool = True, serve_stale: bool = True) -> AIAnalysis:
+    """Return a saved analysis for the user, reusing the cached one when their data is unchanged.
+
+    With save_failures=False a fallback response raises AnalysisFailed instead
+    of being stored, so the caller can retry. When generation fails or Gemini
+    refuses the call (e.g. its circuit breaker is open), serve_stale returns the
+    last successful analysis instead, if there is one; otherwise a refusal
+    raises LLMRejectedError.
+    """
+    # Reuse the last analysis of this type if the underlying data is unchanged
+    fingerprint = await data_fingerprint(db, user_id)
+    cached = await find_current_analysis(db, user_id, analysis_type, fingerprint)
+    if cached is not None:
+        insights_cache.stats.hit()
+        return cached
+
+    # Compact, size-bounded summary of the user's transactions
+    context = await db.run_sync(build_prompt_context, user_id)
+
+    # Get user's budget
+    budget = (await db.execute(select(Budget).where(Budget.user_id == user_id))).scalars().first()
+
+    # Get user's savings goals
+    savings_goals = (await db.execute(select(SavingsGoal).where(SavingsGoal.user_id == user_id))).scalars().all()
+
+    # Category totals from the rollup table
+    totals = await db.run_sync(get_spending_totals, user_id)
+
+    # End the read transaction so no connection or snapshot is held during the AI call
+    await db.commit()
+
+    # Generate insights using Gemini API
+    started = time.perf_counter()
+    rejected = None
+    try:
+        insights = await generate_financial_insights(
+            transactions=None,
+            context=context["text"],
+            budget=budget,
+            savings_goals=savings_goals,
+            analysis_type=analysis_type,
+            totals=totals
+        )
+    except LLMRejectedError as e:
+        rejected, insights = e, None
+    insights_cache.stats.miss(time.perf_counter() - started)
+    failed = rejected is not None or is_error_response(insights)
+
+    # An older analysis is more useful than an error message
+    if failed and serve_stale:
+        stale = await latest_analysis(db, user_id, analysis_type)
+        if stale is not None:
+            return stale
+    if rejected is not None:
+        raise rejected
+    if failed and not save_failures:
+        raise AnalysisFailed(insights)
+
+    # Save analysis to database
+    new_analysis = AIAnalysis(
+        user_id=user_id,
+        analysis_type=analysis_type,
+        result=insights,
+        data_fingerprint=None if failed else fingerprint
+    )
+    db.add(new_analysis)
+    await db.commit()
+    await db.refresh(new_analysis)
+
+    # Failures are saved for the history but not served again
+    if not failed:
+        insights_cache.set((user_id, analysis_type, fingerprint), new_analysis.analysis_id)
+
+    return new_analysis
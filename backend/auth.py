@@ -1,79 +1,174 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
-from models import User
-
-# Configuration
-SECRET_KEY = "your-secret-key-change-in-production"  # Change this in production
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def verify_token(token: str, credentials_exception):
-    """Verify and decode a JWT token"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id_str = payload.get("sub")
-        if user_id_str is None:
-            raise credentials_exception
-        return int(user_id_str)  # Convert string back to int
-    except JWTError:
-        raise credentials_exception
-
-def authenticate_user(db: Session, email: str, password: str):
-    """Authenticate a user with email and password"""
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        return False
-    if not verify_password(password, user.password_hash):
-        return False
-    return user
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    user_id = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if user is None:
-        raise credentials_exception
-    return user
-
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
-    """Get the current active user"""
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import TTLCache
+from database import get_db
+from models import User, UserResponse
+from user_cache import user_cache
+
+# Configuration
+SECRET_KEY = "your-secret-key-change-in-production"  # Change this in production
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Password hashing. Hashes made with a different cost than BCRYPT_ROUNDS are
+# upgraded transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    # needs_update() compares against these, not the default, so pin both ends
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt runs in a bounded thread pool (the C extension releases the GIL) so a
+# burst of logins cannot freeze the event loop. Beyond PASSWORD_HASH_MAX_PENDING
+# queued or running hashes, requests are rejected with 503 instead of queueing.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending_hashes = 0
+
+# Verified tokens, keyed by SHA-256 digest, are kept until their exp so repeat
+# requests skip the signature check and JSON parsing.
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+token_cache = TTLCache(TOKEN_CACHE_MAX_ENTRIES, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# OAuth2 scheme
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password: str) -> str:
+    """Hash a password"""
+    return pwd_context.hash(password)
+
+async def _run_in_hash_pool(fn, *args):
+    """Run a hashing call on the password pool, shedding load once the queue is full"""
+    global _pending_hashes
+    if _pending_hashes >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _pending_hashes -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool"""
+    return await _run_in_hash_pool(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Create a JWT access token"""
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # iat/jti identify the token so the user cache can key on it
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+def _decode_token_uncached(token: str, credentials_exception) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def decode_token(token: str, credentials_exception) -> dict:
+    """Verify a JWT token and return its claims, using the verified-token cache"""
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        token_cache.stats.hit()
+        return payload
+
+    started = time.perf_counter()
+    payload = _decode_token_uncached(token, credentials_exception)
+    token_cache.stats.miss(time.perf_counter() - started)
+    # The cache TTL is only a default; never keep a token past its own expiry
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        token_cache.set(digest, payload, ttl=min(remaining, token_cache.ttl))
+    return payload
+
+def verify_token(token: str, credentials_exception):
+    """Verify and decode a JWT token"""
+    return int(decode_token(token, credentials_exception)["sub"])  # Convert string back to int
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    """Authenticate a user with email and password"""
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if not user:
+        return False
+    # verify_and_update also returns a new hash when needs_update() says the stored one is outdated
+    valid, new_hash = await _run_in_hash_pool(pwd_context.verify_and_update, password, user.password_hash)
+    if not valid:
+        return False
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> UserResponse:
+    """Get the current authenticated user from JWT token.
+
+    Returns a UserResponse projection, served from the user cache when possible.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    claims = decode_token(token, credentials_exception)
+    user_id = int(claims["sub"])
+    # Tokens issued before jti was added fall back to their issue time
+    token_id = str(claims.get("jti") or claims.get("iat", ""))
+
+    user, generation = await user_cache.get(user_id, token_id)
+    if user is not None:
+        user_cache.stats.hit()
+        return user
+
+    started = time.perf_counter()
+    db_user = await db.get(User, user_id)
+    if db_user is None:
+        raise credentials_exception
+    user = UserResponse.model_validate(db_user)
+    user_cache.stats.miss(time.perf_counter() - started)
+    await user_cache.set(user_id, token_id, user, generation)
+    return user
+
+async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
+    """Get the current active user"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+API latency benchmark under mixed load.
+
+Runs against a live server: "light" clients hit cheap endpoints while "heavy"
+clients pull a user's full transaction list, and per-route latency
+percentiles are reported. When handlers block the event loop, the light
+routes' p99 tracks the heavy queries; with non-blocking handlers it stays flat.
+
+Usage:
+    python bench_api_latency.py [--url http://localhost:8000] [--seconds 10] [--light 16] [--heavy 4]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+
+def setup_user(base_url, seed_rows):
+    """Register a throwaway user, seed transactions and return auth headers"""
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    requests.post(f"{base_url}/users/", json={"name": "Bench User", "email": email, "password": "benchpass123"})
+    token = requests.post(f"{base_url}/token", data={"username": email, "password": "benchpass123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    start = datetime(2023, 1, 1)
+    rows = [
+        {"amount": -(i % 900) - 1.0, "category": ["Food", "Rent", "Shopping", "Utilities"][i % 4],
+         "description": f"Bench purchase {i}", "date": (start + timedelta(hours=i)).isoformat(),
+         "payment_method": "UPI"}
+        for i in range(seed_rows)
+    ]
+    response = requests.post(f"{base_url}/transactions/bulk", json=rows, headers=headers)
+    if response.status_code == 404:
+        # Older servers without the bulk endpoint
+        for row in rows:
+            requests.post(f"{base_url}/transactions/", json=row, headers=headers)
+    return headers
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-route latency under mixed load")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--light", type=int, default=16, help="Clients calling GET /users/me and /budgets/")
+    parser.add_argument("--heavy", type=int, default=4, help="Clients calling GET /transactions/")
+    parser.add_argument("--seed-rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"🌱 Seeding {args.seed_rows} transactions...")
+    headers = setup_user(args.url, args.seed_rows)
+
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client(routes):
+        session = requests.Session()
+        i = 0
+        while not stop.is_set():
+            route = routes[i % len(routes)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                ok = session.get(f"{args.url}{route}", headers=headers, timeout=60).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies[route].append(elapsed)
+                else:
+                    failures[route] += 1
+
+    threads = [threading.Thread(target=client, args=(["/users/me", "/budgets/"],)) for _ in range(args.light)]
+    threads += [threading.Thread(target=client, args=(["/transactions/"],)) for _ in range(args.heavy)]
+    print(f"🏁 {args.light} light + {args.heavy} heavy clients for {args.seconds}s against {args.url}")
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{'route':<16} {'requests':>9} {'p50':>10} {'p95':>10} {'p99':>10} {'failed':>7}")
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{route:<16} {len(values):>9} {statistics.median(values) * 1000:>8.1f}ms "
+              f"{percentile(values, 0.95) * 1000:>8.1f}ms {percentile(values, 0.99) * 1000:>8.1f}ms {failures[route]:>7}")
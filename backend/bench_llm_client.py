@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Gemini client overhead benchmark - a model per call vs the shared, pooled client.
+
+Sends the same prompt to the local Gemini stub (gemini_stub.py, run in its own
+process with --delay seconds of latency) from --threads threads, first the old
+way, constructing genai.GenerativeModel for every call on the SDK's default
+connection pool, then through llm_client's shared model with its pool sized to
+the threads. Reports mean per-call latency, throughput and TCP connections
+opened; against the real API every extra connection also costs a TLS
+handshake. The cost of constructing a model on its own is printed first.
+
+Usage:
+    python bench_llm_client.py [--calls 2000] [--threads 16]
+"""
+
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser(description="Compare per-call and shared Gemini clients")
+parser.add_argument("--calls", type=int, default=2000)
+parser.add_argument("--threads", type=int, default=16)
+parser.add_argument("--delay", type=float, default=0.01, help="Stub response delay in seconds")
+args = parser.parse_args()
+
+with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+stub_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemini_stub.py")
+stub = subprocess.Popen([sys.executable, stub_script, "--port", str(port), "--delay", str(args.delay)], stdout=subprocess.DEVNULL)
+os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{port}"
+os.environ["GEMINI_MAX_CONCURRENCY"] = str(args.threads)
+
+import google.generativeai as genai
+
+import llm_client
+
+PROMPT = "How much can I spend today?"
+
+class ConnectionCounter(logging.Handler):
+    """Counts the "Starting new HTTP connection" debug messages from urllib3"""
+    count = 0
+
+    def emit(self, record):
+        if record.getMessage().startswith("Starting new"):
+            ConnectionCounter.count += 1
+
+connection_log = logging.getLogger("urllib3.connectionpool")
+connection_log.setLevel(logging.DEBUG)
+connection_log.addHandler(ConnectionCounter())
+connection_log.propagate = False
+
+def wait_for_stub():
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+def model_per_call():
+    return genai.GenerativeModel(llm_client.GEMINI_MODEL).generate_content(PROMPT, request_options=llm_client._REQUEST_OPTIONS).text
+
+def run(label, call):
+    call()  # Warm up the client
+    ConnectionCounter.count = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        timings = list(pool.map(lambda _: timed(call), range(args.calls)))
+    elapsed = time.perf_counter() - started
+    mean = sum(timings) / len(timings)
+    connections = ConnectionCounter.count
+    print(f"{label:<16} {mean * 1000:>9.2f}ms {args.calls / elapsed:>10.0f}/s {connections:>12}")
+
+def timed(call):
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+if __name__ == "__main__":
+    wait_for_stub()
+    print(f"{args.calls} calls from {args.threads} threads against the local stub ({args.delay * 1000:g}ms delay)")
+    started = time.perf_counter()
+    for _ in range(10000):
+        genai.GenerativeModel(llm_client.GEMINI_MODEL)
+    print(f"GenerativeModel construction: {(time.perf_counter() - started) / 10000 * 1e6:.1f}µs\n")
+
+    print(f"{'client':<16} {'per call':>11} {'throughput':>12} {'connections':>12}")
+
+    # Before: plain SDK configuration and a new model for each call
+    genai.configure(api_key="stub", transport="rest", client_options={"api_endpoint": os.environ["GEMINI_API_ENDPOINT"]})
+    run("model per call", model_per_call)
+
+    # After: shared model and pooled connections from llm_client.configure
+    llm_client.configure("stub")
+    run("shared, pooled", lambda: llm_client._generate_blocking(PROMPT))
+    stub.terminate()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Password hashing benchmark - login throughput per core and event-loop stall.
+
+Runs a burst of concurrent bcrypt verifications two ways: inline on the event
+loop (how /token used to behave) and on the auth hashing pool. For each, it
+reports verifications per second, per core, and the worst delay seen by a
+heartbeat task that should tick every 10ms.
+
+Usage:
+    python bench_login_throughput.py [--logins 64] [--rounds 12]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import auth
+
+async def heartbeat(stop, lags, interval=0.01):
+    """Record how late each tick fires; large values mean the loop was blocked"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+async def run(mode, logins, hashed):
+    stop = asyncio.Event()
+    lags = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0.05)
+
+    async def login():
+        if mode == "inline":
+            return auth.verify_password("benchpass123", hashed)
+        return await auth.verify_password_async("benchpass123", hashed)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[login() for _ in range(logins)], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+
+    ok = sum(1 for result in results if result is True)
+    return ok / elapsed, max(lags) if lags else 0.0, logins - ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare inline and pooled bcrypt verification")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=auth.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    hashed = auth.pwd_context.hash("benchpass123", rounds=args.rounds)
+    print(f"🔐 {args.logins} concurrent logins, bcrypt rounds={args.rounds}, "
+          f"{auth.PASSWORD_HASH_WORKERS} pool workers, {cores} cores")
+    print(f"{'mode':<8} {'logins/s':>10} {'per core':>10} {'max loop stall':>16} {'rejected':>9}")
+    for mode in ("inline", "pool"):
+        rate, stall, rejected = asyncio.run(run(mode, args.logins, hashed))
+        print(f"{mode:<8} {rate:>10.1f} {rate / cores:>10.1f} {stall * 1000:>14.1f}ms {rejected:>9}")
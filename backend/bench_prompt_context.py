@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Prompt size benchmark - full JSON transaction dump vs the compact context.
+
+For users with 100, 10k and 100k transactions (scratch SQLite database), builds
+the chat prompt both ways and reports prompt bytes, estimated tokens, build
+time and end-to-end latency of sending it to the local Gemini stub
+(gemini_stub.py, no artificial delay), which covers loading, serialization
+and transfer of the prompt.
+
+Usage:
+    python bench_prompt_context.py [--sizes 100,10000,100000]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from gemini_stub import start_stub
+
+stub = start_stub()
+os.environ["GEMINI_API_KEY"] = "stub"
+os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{stub.server_port}"
+
+from sqlalchemy.orm import sessionmaker
+
+import llm_client
+from ai_service import build_chat_prompt
+from database import Base, create_db_engine
+from ingest import insert_transactions
+from models import Transaction, TransactionCreate, User
+from prompt_context import build_prompt_context, estimate_tokens
+from rollups import get_spending_totals
+
+QUESTION = "How much can I spend today?"
+CATEGORIES = ["Food", "Rent", "Shopping", "Utilities", "Travel", "Health", "Entertainment", "Income"]
+
+def seed_user(db, rows):
+    user = User(name="Prompt Bench", email=f"prompt-{rows}@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(rows):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        batch.append(TransactionCreate(
+            amount=25000.0 if category == "Income" else -float((i * 37) % 4000 + 10),
+            category=category,
+            description=f"{category} payment #{i} at merchant {i % 97}",
+            date=start + timedelta(minutes=30 * i),
+            payment_method=["UPI", "Credit Card", "Cash"][i % 3],
+        ))
+        if len(batch) == 5000:
+            insert_transactions(db, user.user_id, batch)
+            batch = []
+    insert_transactions(db, user.user_id, batch)
+    db.commit()
+    return user.user_id
+
+def full_prompt(db, user_id):
+    transactions = db.query(Transaction).filter(Transaction.user_id == user_id).all()
+    return build_chat_prompt(QUESTION, transactions, None, [])
+
+def compact_prompt(db, user_id):
+    context = build_prompt_context(db, user_id)
+    return build_chat_prompt(QUESTION, None, None, [], get_spending_totals(db, user_id), context["text"])
+
+def measure(build, db, user_id):
+    started = time.perf_counter()
+    prompt = build(db, user_id)
+    built = time.perf_counter() - started
+    asyncio.run(llm_client.generate(prompt))
+    return len(prompt.encode()), estimate_tokens(prompt), built, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full and compact AI prompt context")
+    parser.add_argument("--sizes", default="100,10000,100000")
+    args = parser.parse_args()
+
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'prompt_bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    print(f"{'transactions':>12} {'mode':<8} {'prompt bytes':>13} {'~tokens':>9} {'build':>9} {'end-to-end':>11}")
+    for rows in [int(size) for size in args.sizes.split(",")]:
+        with Session() as db:
+            user_id = seed_user(db, rows)
+            for mode, build in (("full", full_prompt), ("compact", compact_prompt)):
+                size, tokens, built, total = measure(build, db, user_id)
+                print(f"{rows:>12} {mode:<8} {size:>13,} {tokens:>9,} {built * 1000:>7.1f}ms {total * 1000:>9.1f}ms")
+    stub.shutdown()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Transaction search benchmark - full-text index vs LIKE scans.
+
+Seeds a scratch SQLite database with --rows transactions spread over --users
+users (the search index is filled by its triggers as rows are inserted), then
+times one user's searches through the FTS5 index and through the LIKE
+fallback, with and without date/amount filters. LIKE is unranked and can stop
+at the first 50 matches in date order, so it is only slow when few of the
+user's transactions match; try fewer --users for users with long histories.
+
+Usage:
+    python bench_search.py [--rows 1000000] [--users 1000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine
+from models import Transaction, User
+from money import to_minor
+from search import search_query, search_terms
+
+MERCHANTS = ["Swiggy", "Zomato", "Starbucks", "Amazon", "Flipkart", "Uber", "Ola", "BigBasket", "DMart", "Netflix",
+             "Spotify", "Airtel", "Jio", "HP Petrol", "Apollo Pharmacy", "Dominos", "McDonalds", "IRCTC", "Myntra"]
+DETAILS = ["lunch", "dinner", "groceries", "ride", "refill", "subscription", "order", "recharge"]
+CATEGORIES = ["Food", "Shopping", "Travel", "Utilities", "Health", "Entertainment"]
+SEARCHES = [
+    ("star", []),
+    ("swi lun", []),
+    ("food", []),
+    ("uber ride", [Transaction.amount_minor <= to_minor(-1000), Transaction.date >= datetime(2024, 6, 1)]),
+    ("12345", []),
+    ("netflix groceries", []),
+]
+
+def seed(db, rows, users):
+    db.add_all(User(name=f"Search {i}", email=f"search-{i}@example.com", password_hash="x") for i in range(users))
+    db.flush()
+    rng = random.Random(1)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "user_id": i % users + 1,
+            "amount_minor": to_minor(-rng.randint(10, 5000)),
+            "category": rng.choice(CATEGORIES),
+            "description": f"{rng.choice(MERCHANTS)} {rng.choice(DETAILS)} #{rng.randint(1000, 99999)}",
+            "date": start + timedelta(minutes=rng.randint(0, 525600)),
+            "payment_method": "UPI",
+        })
+        if len(batch) == 10000:
+            db.execute(insert(Transaction), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Transaction), batch)
+    db.commit()
+
+def timed(db, dialect, q, conditions, repeat=20):
+    query = search_query(dialect, 1, search_terms(q), conditions, 50)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = db.execute(query).all()
+    return (time.perf_counter() - started) / repeat, len(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare indexed and LIKE transaction search")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search_bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        started = time.perf_counter()
+        seed(db, args.rows, args.users)
+        print(f"Seeded {args.rows:,} transactions for {args.users:,} users in {time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'query':<22} {'filters':>8} {'fts5':>10} {'like':>10} {'results':>8}")
+        for q, conditions in SEARCHES:
+            fts, found = timed(db, "sqlite", q, conditions)
+            like, _ = timed(db, "default", q, conditions, repeat=3)
+            print(f"{q!r:<22} {len(conditions):>8} {fts * 1000:>8.2f}ms {like * 1000:>8.1f}ms {found:>8}")
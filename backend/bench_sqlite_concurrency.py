@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark SQLite read/write concurrency for each PRAGMA profile in database.py.
+
+Writer threads insert-and-commit single transactions while reader threads run
+a per-user aggregate, against a scratch database per profile. Reports write
+and read throughput, read latency percentiles and lock errors.
+
+Usage:
+    python bench_sqlite_concurrency.py [--seconds 5] [--writers 2] [--readers 8]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, SQLITE_PROFILES, create_db_engine
+from models import Transaction, User
+
+SEED_ROWS = 20000
+
+def run_profile(profile, seconds, writers, readers):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        with Session() as db:
+            db.add(User(user_id=1, name="Bench", email="bench@example.com", password_hash="x"))
+            db.bulk_insert_mappings(Transaction, [
+                {"user_id": 1, "amount_minor": -(i % 500) * 100, "category": f"C{i % 12}", "description": "seed",
+                 "date": datetime(2024, 1, 1 + i % 28), "payment_method": "UPI"}
+                for i in range(SEED_ROWS)
+            ])
+            db.commit()
+
+        stop = threading.Event()
+        write_count = [0]
+        read_latencies = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def writer():
+            while not stop.is_set():
+                try:
+                    with Session() as db:
+                        db.add(Transaction(user_id=1, amount_minor=-1000, category="C0", description="bench",
+                                           date=datetime.utcnow(), payment_method="UPI"))
+                        db.commit()
+                    with lock:
+                        write_count[0] += 1
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+
+        def reader():
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with Session() as db:
+                        db.query(Transaction.category, func.sum(Transaction.amount_minor)).filter(
+                            Transaction.user_id == 1
+                        ).group_by(Transaction.category).all()
+                    with lock:
+                        read_latencies.append(time.perf_counter() - started)
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    read_latencies.sort()
+    return {
+        "writes_per_s": write_count[0] / seconds,
+        "reads_per_s": len(read_latencies) / seconds,
+        "read_p50_ms": statistics.median(read_latencies) * 1000 if read_latencies else 0.0,
+        "read_p99_ms": read_latencies[int(len(read_latencies) * 0.99) - 1] * 1000 if read_latencies else 0.0,
+        "errors": errors[0],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare SQLite PRAGMA profiles under concurrent load")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"🏁 {args.writers} writers, {args.readers} readers, {args.seconds}s per profile, {SEED_ROWS} seed rows")
+    print(f"{'profile':<12} {'writes/s':>10} {'reads/s':>10} {'read p50':>10} {'read p99':>10} {'errors':>8}")
+    for profile in SQLITE_PROFILES:
+        result = run_profile(profile, args.seconds, args.writers, args.readers)
+        print(f"{profile:<12} {result['writes_per_s']:>10.1f} {result['reads_per_s']:>10.1f} "
+              f"{result['read_p50_ms']:>8.2f}ms {result['read_p99_ms']:>8.2f}ms {result['errors']:>8}")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Token verification benchmark - cached vs uncached JWT decoding.
+
+Issues a pool of access tokens and decodes them repeatedly, once through
+python-jose on every call (the old verify_token path) and once through the
+verified-token cache, reporting the cost per decode.
+
+Usage:
+    python bench_token_decode.py [--tokens 100] [--iterations 100000]
+"""
+
+import argparse
+import time
+
+from fastapi import HTTPException
+
+import auth
+
+def run(decode, tokens, iterations):
+    error = HTTPException(status_code=401)
+    started = time.perf_counter()
+    for i in range(iterations):
+        decode(tokens[i % len(tokens)], error)
+    return (time.perf_counter() - started) / iterations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare cached and uncached JWT verification")
+    parser.add_argument("--tokens", type=int, default=100, help="Distinct tokens in rotation")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    tokens = [auth.create_access_token({"sub": str(user_id)}) for user_id in range(args.tokens)]
+    print(f"🔑 {args.iterations} decodes over {args.tokens} tokens")
+
+    uncached = run(auth._decode_token_uncached, tokens, args.iterations)
+    auth.token_cache.clear()
+    cached = run(auth.decode_token, tokens, args.iterations)
+    stats = auth.token_cache.stats.snapshot()
+
+    print(f"{'path':<10} {'per decode':>12} {'decodes/s':>12}")
+    print(f"{'uncached':<10} {uncached * 1e6:>10.2f}µs {1 / uncached:>12.0f}")
+    print(f"{'cached':<10} {cached * 1e6:>10.2f}µs {1 / cached:>12.0f}")
+    print(f"⚡ {uncached / cached:.1f}x faster, cache hit rate {stats['hit_rate']:.1%}")
@@ -0,0 +1,95 @@
+"""
+Small in-process caches shared by the auth and AI layers.
+
+TTLCache is a thread-safe LRU with a per-entry expiry; CacheStats counts hits
+and misses and how much lookup time the hits saved.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class CacheStats:
+    """Hit/miss counters plus the average cost of a miss, to estimate time saved"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.miss_seconds = 0.0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self, lookup_seconds: float = 0.0):
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += lookup_seconds
+
+    def evicted(self, count: int = 1):
+        with self._lock:
+            self.evictions += count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_miss_ms": avg_miss * 1000,
+                "saved_seconds": self.hits * avg_miss,
+            }
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire at a per-entry deadline"""
+
+    def __init__(self, maxsize: int, ttl: float, stats: Optional[CacheStats] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = stats or CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value or None; does not count towards stats"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value for ttl seconds (default: the cache TTL), evicting the LRU entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.stats.evicted(evicted)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,144 @@
+"""
+Conversation history for chat prompts: recent messages plus a rolling summary.
+
+Messages not yet covered by the user's summary go into the prompt verbatim,
+newest first up to CHAT_RECENT_MESSAGES + CHAT_SUMMARY_BATCH and each cut to
+CHAT_MESSAGE_CHARS, after the summary of everything older. Once that many have
+built up, refresh_summary() folds all but the newest CHAT_RECENT_MESSAGES into
+the summary with one Gemini call that reads only the old summary and those
+messages. The history in a prompt, and the cost of keeping it, stay bounded
+however long the conversation gets.
+
+The summary is stored in chat_summaries with the id of the last message it
+covers, so it survives restarts and is shared by all workers.
+"""
+
+import os
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ai_service import summarize_chat
+from database import AsyncSessionLocal
+from models import ChatMessage, ChatSummary
+
+CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "8"))
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "10"))
+CHAT_MESSAGE_CHARS = int(os.getenv("CHAT_MESSAGE_CHARS", "600"))
+CHAT_SUMMARY_WORDS = int(os.getenv("CHAT_SUMMARY_WORDS", "200"))
+# Most messages folded in one refresh; older ones beyond that (e.g. history from
+# before summaries existed) are skipped rather than sent in one huge prompt
+CHAT_SUMMARY_MAX_FOLD = int(os.getenv("CHAT_SUMMARY_MAX_FOLD", "40"))
+
+# Users whose summary is being refreshed by this process
+_refreshing = set()
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def format_messages(messages) -> str:
+    return "\n".join(
+        f"{'User' if message.is_user else 'Assistant'}: {_clip(message.content, CHAT_MESSAGE_CHARS)}"
+        for message in messages
+    )
+
+def normalize_chat_timestamps(db: Session):
+    """Give SQLite created_at values written by CURRENT_TIMESTAMP the microseconds SQLAlchemy writes.
+
+    SQLite compares datetimes as text, so '2024-05-01 12:00:00' sorts before
+    the bound '2024-05-01 12:00:00.000000' and a page cursor on that second
+    would never move past it.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    updated = db.execute(
+        update(ChatMessage).where(func.length(ChatMessage.created_at) == 19)
+        .values(created_at=ChatMessage.created_at.concat(".000000"))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if updated:
+        print(f"✅ Normalized {updated} chat message timestamps")
+
+async def _newest_unsummarized(db: AsyncSession, user_id: int, through_message_id: int, limit: int,
+                               offset: int = 0, before_message_id: Optional[int] = None) -> List:
+    """Messages after the summary, newest first, skipping the newest `offset`"""
+    query = select(ChatMessage.message_id, ChatMessage.is_user, ChatMessage.content).where(
+        ChatMessage.user_id == user_id, ChatMessage.message_id > through_message_id
+    )
+    if before_message_id is not None:
+        query = query.where(ChatMessage.message_id < before_message_id)
+    query = query.order_by(ChatMessage.created_at.desc(), ChatMessage.message_id.desc()).offset(offset).limit(limit)
+    return (await db.execute(query)).all()
+
+async def build_chat_history(db: AsyncSession, user_id: int, before_message_id: Optional[int] = None) -> str:
+    """Summary and recent messages before before_message_id, as text for the chat prompt ("" if none)"""
+    summary = await db.get(ChatSummary, user_id)
+    through = summary.through_message_id if summary else 0
+    recent = await _newest_unsummarized(
+        db, user_id, through, CHAT_RECENT_MESSAGES + CHAT_SUMMARY_BATCH, before_message_id=before_message_id
+    )
+
+    sections = []
+    if summary:
+        sections.append(f"Summary of earlier messages: {summary.summary}")
+    if recent:
+        sections.append("Recent messages, oldest first:\n" + format_messages(reversed(recent)))
+    return "\n".join(sections)
+
+async def refresh_summary(user_id: int):
+    """Fold older messages into the user's summary once CHAT_SUMMARY_BATCH of them are waiting.
+
+    Runs after a chat reply has been sent. If Gemini fails, the summary is
+    left as it is and the next reply tries again.
+    """
+    if user_id in _refreshing:
+        return
+    _refreshing.add(user_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            summary = await db.get(ChatSummary, user_id)
+            through = summary.through_message_id if summary else 0
+            waiting = (await db.execute(
+                select(func.count()).select_from(ChatMessage).where(
+                    ChatMessage.user_id == user_id, ChatMessage.message_id > through
+                )
+            )).scalar()
+            if waiting < CHAT_RECENT_MESSAGES + CHAT_SUMMARY_BATCH:
+                return
+
+            # The messages just before the recent window, oldest first
+            fold = min(waiting - CHAT_RECENT_MESSAGES, CHAT_SUMMARY_MAX_FOLD)
+            messages = list(reversed(await _newest_unsummarized(db, user_id, through, fold, offset=CHAT_RECENT_MESSAGES)))
+            previous = summary.summary if summary else None
+            # End the read transaction so no connection or snapshot is held during the AI call
+            await db.commit()
+
+            text = await summarize_chat(previous, format_messages(messages), CHAT_SUMMARY_WORDS)
+            if text is None:
+                return
+            text = _clip(text, CHAT_SUMMARY_WORDS * 8)
+            new_through = messages[-1].message_id
+
+            if summary is None:
+                db.add(ChatSummary(user_id=user_id, summary=text, through_message_id=new_through))
+            else:
+                # Only if no other worker moved the summary on in the meantime
+                await db.execute(
+                    update(ChatSummary)
+                    .where(ChatSummary.user_id == user_id, ChatSummary.through_message_id == through)
+                    .values(summary=text, through_message_id=new_through)
+                )
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another worker created the first summary at the same time
+                await db.rollback()
+    except Exception as e:
+        print(f"❌ Chat summary refresh failed for user {user_id}: {e}")
+    finally:
+        _refreshing.discard(user_id)
@@ -0,0 +1,61 @@
+"""
+Server-Sent Events encoding of a streamed chat answer.
+
+Each piece of text is sent as a `token` event as soon as Gemini produces it.
+Once the answer is complete it is saved as a ChatMessage and a final `done`
+event carries the stored message, so clients can swap their draft for it. If
+no answer is saved (the call is refused or fails, or the client goes away),
+the user's message is deleted so it does not linger unanswered in the history.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator
+
+from sqlalchemy import delete
+
+from database import AsyncSessionLocal
+from llm_client import LLMRejectedError
+from models import ChatMessage, ChatMessageResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop reverse proxies such as nginx from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _delete_message(message_id: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(ChatMessage).where(ChatMessage.message_id == message_id))
+        await db.commit()
+
+async def chat_events(user_id: int, user_message_id: int, pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+    unanswered = True
+    try:
+        parts = []
+        try:
+            async for piece in pieces:
+                parts.append(piece)
+                yield sse_event("token", {"text": piece})
+        except LLMRejectedError as e:
+            # Deleted before the error is sent, so a client reloading the history won't see it
+            unanswered = False
+            await asyncio.shield(_delete_message(user_message_id))
+            yield sse_event("error", {"detail": str(e)})
+            return
+
+        # The request's session is closed once the response starts, so save with a new one
+        async with AsyncSessionLocal() as db:
+            ai_message = ChatMessage(user_id=user_id, is_user=0, content="".join(parts))
+            db.add(ai_message)
+            await db.commit()
+            await db.refresh(ai_message)
+        unanswered = False
+        yield sse_event("done", ChatMessageResponse.model_validate(ai_message).model_dump(mode="json"))
+    finally:
+        if unanswered:
+            # Failed or abandoned by the client; shielded since a disconnect cancels the response task
+            await asyncio.shield(_delete_message(user_message_id))
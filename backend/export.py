@@ -0,0 +1,146 @@
+"""
+Streaming transaction export as CSV, NDJSON and (with pyarrow) Parquet or Arrow.
+
+Rows are fetched with yield_per and encoded one partition at a time, so memory
+stays flat however long the history is and the first bytes go out before the
+query has finished.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import Transaction
+from money import from_minor
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Columnar formats are optional
+    pa = None
+
+# Rows fetched from the database and encoded per chunk
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_COLUMNS = ["transaction_id", "date", "amount", "currency", "category", "description", "payment_method", "created_at"]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+def columnar_available() -> bool:
+    return pa is not None
+
+async def _iter_partitions(user_id: int, conditions: List) -> AsyncIterator[list]:
+    """Yield lists of row tuples, with decimal amounts, from a session owned by the stream itself.
+
+    The request's session is closed once the handler returns, before the
+    response body is sent, so the generator opens its own.
+    """
+    columns = [Transaction.amount_minor if column == "amount" else getattr(Transaction, column) for column in EXPORT_COLUMNS]
+    async with AsyncSessionLocal() as db:
+        statement = (
+            select(*columns)
+            .where(Transaction.user_id == user_id, *conditions)
+            .order_by(Transaction.date, Transaction.transaction_id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        result = await db.stream(statement)
+        async for partition in result.partitions():
+            yield [(*row[:2], from_minor(row[2], row[3]), *row[3:]) for row in partition]
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+async def _csv_stream(partitions: AsyncIterator[list]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    async for partition in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        for transaction_id, date, amount, currency, category, description, payment_method, created_at in partition:
+            writer.writerow([transaction_id, _isoformat(date), amount, currency, category, description, payment_method, _isoformat(created_at)])
+        yield buffer.getvalue()
+
+async def _ndjson_stream(partitions: AsyncIterator[list]) -> AsyncIterator[str]:
+    async for partition in partitions:
+        yield "".join(
+            json.dumps({
+                "transaction_id": transaction_id,
+                "date": _isoformat(date),
+                "amount": amount,
+                "currency": currency,
+                "category": category,
+                "description": description,
+                "payment_method": payment_method,
+                "created_at": _isoformat(created_at),
+            }) + "\n"
+            for transaction_id, date, amount, currency, category, description, payment_method, created_at in partition
+        )
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+async def _columnar_stream(partitions: AsyncIterator[list], fmt: str) -> AsyncIterator[bytes]:
+    schema = pa.schema([
+        ("transaction_id", pa.int64()),
+        ("date", pa.timestamp("us")),
+        ("amount", pa.float64()),
+        ("currency", pa.string()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+        ("payment_method", pa.string()),
+        ("created_at", pa.timestamp("us")),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa_ipc.new_stream(sink, schema)
+    async for partition in partitions:
+        # One row group / record batch per partition
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array([row[i] for row in partition], type=field.type) for i, field in enumerate(schema)],
+            schema=schema,
+        )
+        if fmt == "parquet":
+            writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def stream_transactions(user_id: int, conditions: List, fmt: str):
+    """Return an iterator over the encoded export of a user's (filtered) transactions"""
+    partitions = _iter_partitions(user_id, conditions)
+    if fmt == "csv":
+        return _csv_stream(partitions)
+    if fmt == "ndjson":
+        return _ndjson_stream(partitions)
+    return _columnar_stream(partitions, fmt)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API, for tests and benchmarks.
+
+Answers generateContent and streamGenerateContent calls with a canned
+response after a configurable delay, so AI traffic can be simulated without
+an API key or quota. Connections are kept alive between requests, and
+`connections` counts how many were opened. Status codes appended to the handler's `failures` list
+are answered first, one per request, to simulate errors. Point the backend at
+it with:
+
+    python gemini_stub.py --port 8089 --delay 5
+    GEMINI_API_KEY=stub GEMINI_API_ENDPOINT=http://localhost:8089 uvicorn main:app
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RESPONSE = "1. Stub insight: spending is on track.\n2. Stub insight: keep saving ₹500 a week."
+
+def _candidate(text: str, finished: bool = True) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, a kept-alive
+    # connection stalls ~40ms on each response waiting for a delayed ACK
+    disable_nagle_algorithm = True
+    delay = 0.0
+    chunk_delay = 0.05
+    response_text = STUB_RESPONSE
+    failures = []
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            type(self).connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        with self.lock:
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            if failure:
+                self._error(failure)
+            else:
+                self._respond()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up, e.g. after its timeout
+
+    def _respond(self):
+        if ":streamGenerateContent" in self.path:
+            self._stream()
+        elif ":generateContent" in self.path:
+            body = json.dumps(_candidate(self.response_text)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def _error(self, code: int):
+        body = json.dumps({"error": {"code": code, "message": f"Stub error {code}", "status": "UNAVAILABLE"}}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        """Send the response a word at a time as a JSON array, like the REST API does"""
+        words = self.response_text.split(" ")
+        pieces = [word + " " for word in words[:-1]] + words[-1:]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        # No Content-Length, so the end of the body is marked by closing the connection
+        self.send_header("Connection", "close")
+        self.close_connection = True
+        self.end_headers()
+        self.wfile.write(b"[")
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self.chunk_delay)
+                self.wfile.write(b",")
+            self.wfile.write(json.dumps(_candidate(piece, finished=i == len(pieces) - 1)).encode())
+            self.wfile.flush()
+        self.wfile.write(b"]")
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(port: int = 0, delay: float = 0.0) -> ThreadingHTTPServer:
+    """Serve the stub on a background thread; port 0 picks a free port"""
+    handler = type("Handler", (GeminiStubHandler,), {"delay": delay, "failures": [], "connections": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini generateContent endpoint")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=2.0, help="Seconds to wait before answering")
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.delay)
+    print(f"🤖 Gemini stub listening on http://localhost:{args.port} (delay {args.delay}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
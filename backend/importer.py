@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Streaming bank-statement importer for CSV and NDJSON files.
+
+Rows are read one at a time, mapped onto the Transaction columns, validated
+with TransactionCreate and written in BULK_CHUNK_SIZE batches. Each row gets a
+content hash of (user, date, amount, description) stored under a unique
+index, so importing the same statement twice only adds the new rows.
+
+Usage:
+    python importer.py statement.csv --email john@example.com
+    python importer.py export.ndjson --user-id 1 --format ndjson
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from fastapi import Request
+from sqlalchemy.orm import Session
+
+import models
+from database import begin_write
+from ingest import BULK_CHUNK_SIZE, MAX_REPORTED_ERRORS, insert_transactions, spool_request, validate_record
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+DEFAULT_CATEGORY = "Uncategorized"
+DEFAULT_PAYMENT_METHOD = "Bank"
+
+# Header names (lower-cased, underscores as spaces) recognised for each field
+COLUMN_ALIASES = {
+    "date": ("date", "transaction date", "txn date", "posted date", "posting date", "value date"),
+    "amount": ("amount", "transaction amount"),
+    "debit": ("debit", "debit amount", "withdrawal", "withdrawal amount", "withdrawal amt"),
+    "credit": ("credit", "credit amount", "deposit", "deposit amount", "deposit amt"),
+    "description": ("description", "narration", "details", "particulars", "memo", "remarks"),
+    "category": ("category",),
+    "payment_method": ("payment method", "mode", "payment mode"),
+}
+
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%d-%b-%Y", "%d %b %Y", "%Y/%m/%d", "%m/%d/%Y")
+
+def _normalize_header(name: str) -> str:
+    return " ".join(name.replace("_", " ").strip().lower().split())
+
+def map_columns(header: List[str]) -> dict:
+    """Map Transaction fields to column positions in a CSV header row"""
+    positions = {_normalize_header(name): i for i, name in enumerate(header)}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in positions:
+                mapping[field] = positions[alias]
+                break
+    if "date" not in mapping or "description" not in mapping:
+        raise ValueError("CSV header must include a date and a description column")
+    if "amount" not in mapping and "debit" not in mapping and "credit" not in mapping:
+        raise ValueError("CSV header must include an amount column or debit/credit columns")
+    return mapping
+
+def parse_amount(text: str) -> Optional[float]:
+    """Parse statement amounts such as "1,250.00", "(500)", "₹99" or "500 Dr" """
+    value = (text or "").strip()
+    if not value:
+        return None
+    sign = 1
+    if value.startswith("(") and value.endswith(")"):
+        sign, value = -1, value[1:-1]
+    suffix = value[-2:].lower()
+    if suffix in ("dr", "cr"):
+        sign = -1 if suffix == "dr" else 1
+        value = value[:-2]
+    value = value.replace(",", "").replace("₹", "").replace("$", "").strip()
+    return sign * float(value)
+
+def parse_date(text: str) -> datetime:
+    """Parse ISO dates first, then the day-first formats common on Indian bank statements"""
+    value = (text or "").strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{value}'")
+
+def csv_records(stream: TextIO, default_category: str, default_payment_method: str) -> Iterator[Tuple[int, dict, Optional[str]]]:
+    """Yield (index, record, error) for each data row of a CSV statement"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    mapping = map_columns(header)
+
+    def cell(row, field):
+        position = mapping.get(field)
+        return row[position] if position is not None and position < len(row) else ""
+
+    for index, row in enumerate(reader):
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            if "amount" in mapping:
+                amount = parse_amount(cell(row, "amount"))
+            else:
+                # Statements list debits and credits as positive numbers in separate columns
+                amount = (parse_amount(cell(row, "credit")) or 0.0) - (parse_amount(cell(row, "debit")) or 0.0)
+            record = {
+                "amount": amount,
+                "category": cell(row, "category").strip() or default_category,
+                "description": cell(row, "description").strip(),
+                "date": parse_date(cell(row, "date")),
+                "payment_method": cell(row, "payment_method").strip() or default_payment_method,
+            }
+        except ValueError as e:
+            yield index, None, str(e)
+            continue
+        yield index, record, None
+
+def ndjson_records(stream: TextIO, default_category: str, default_payment_method: str) -> Iterator[Tuple[int, dict, Optional[str]]]:
+    """Yield (index, record, error) for each line of an NDJSON file"""
+    index = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield index, None, f"Invalid JSON: {e}"
+        else:
+            if isinstance(record, dict):
+                record.setdefault("category", default_category)
+                record.setdefault("payment_method", default_payment_method)
+            yield index, record, None
+        index += 1
+
+def content_hash(user_id: int, transaction: models.TransactionCreate) -> str:
+    """Dedup key for an imported row"""
+    key = "|".join([
+        str(user_id),
+        transaction.date.isoformat(),
+        f"{transaction.amount:.2f}",
+        " ".join(transaction.description.lower().split()),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def process_peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of the whole process since it started, in MB, where the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _write_batch(db: Session, user_id: int, batch: List[models.TransactionCreate], hashes: List[str]) -> int:
+    """Insert the rows of a batch whose hashes are not stored yet and commit"""
+    begin_write(db)
+    inserted = insert_transactions(db, user_id, batch, hashes)
+    db.commit()
+    return inserted
+
+def import_statement(
+    db: Session,
+    user_id: int,
+    stream: TextIO,
+    fmt: str = "csv",
+    default_category: str = DEFAULT_CATEGORY,
+    default_payment_method: str = DEFAULT_PAYMENT_METHOD,
+) -> models.ImportReport:
+    """Import a CSV or NDJSON statement for a user and report counts, throughput and the process's peak RSS.
+
+    Each batch is committed on its own so memory and journal size stay bounded;
+    re-running an interrupted import skips the rows already stored.
+    """
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Unsupported import format '{fmt}'")
+    records = csv_records if fmt == "csv" else ndjson_records
+
+    started = time.perf_counter()
+    rows_read = inserted = failed = 0
+    errors = []
+    batch, hashes = [], []
+    # Identical rows within one statement (two equal coffees on the same day)
+    # are kept apart by their occurrence number
+    occurrences = Counter()
+
+    for index, record, error in records(stream, default_category, default_payment_method):
+        rows_read += 1
+        if error is None:
+            transaction, row_errors = validate_record(record)
+        else:
+            transaction, row_errors = None, [error]
+        if row_errors:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(models.BulkRowError(index=index, errors=row_errors))
+            continue
+
+        base_hash = content_hash(user_id, transaction)
+        occurrences[base_hash] += 1
+        occurrence = occurrences[base_hash]
+        batch.append(transaction)
+        hashes.append(base_hash if occurrence == 1 else f"{base_hash}:{occurrence}")
+        if len(batch) >= BULK_CHUNK_SIZE:
+            inserted += _write_batch(db, user_id, batch, hashes)
+            batch, hashes = [], []
+    if batch:
+        inserted += _write_batch(db, user_id, batch, hashes)
+
+    elapsed = time.perf_counter() - started
+    return models.ImportReport(
+        rows_read=rows_read,
+        inserted=inserted,
+        duplicates=rows_read - inserted - failed,
+        failed=failed,
+        errors=errors,
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round(rows_read / elapsed, 1) if elapsed > 0 else 0.0,
+        process_peak_rss_mb=process_peak_rss_mb(),
+    )
+
+async def spool_request_body(request: Request) -> TextIO:
+    """Copy an upload into a temp file (in memory until SPOOL_MAX_MEMORY) and return it as text"""
+    return io.TextIOWrapper(await spool_request(request), encoding="utf-8-sig", newline="")
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine, upgrade_schema
+
+    parser = argparse.ArgumentParser(description="Import a bank statement (CSV or NDJSON) into FlexiFi")
+    parser.add_argument("path", help="Statement file to import")
+    user = parser.add_mutually_exclusive_group(required=True)
+    user.add_argument("--user-id", type=int, help="Owner of the imported transactions")
+    user.add_argument("--email", help="Email of the owner of the imported transactions")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    parser.add_argument("--category", default=DEFAULT_CATEGORY, help="Category for rows without one")
+    parser.add_argument("--payment-method", default=DEFAULT_PAYMENT_METHOD, help="Payment method for rows without one")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.lower().endswith((".ndjson", ".jsonl")) else "csv")
+
+    models.Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    db = SessionLocal()
+    try:
+        if args.email:
+            owner = db.query(models.User).filter(models.User.email == args.email).first()
+        else:
+            owner = db.query(models.User).filter(models.User.user_id == args.user_id).first()
+        if owner is None:
+            print("❌ User not found")
+            sys.exit(1)
+
+        print(f"📥 Importing {args.path} for user {owner.user_id}...")
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            report = import_statement(db, owner.user_id, stream, fmt, args.category, args.payment_method)
+
+        print(f"✅ Read {report.rows_read} rows: {report.inserted} inserted, {report.duplicates} duplicates, {report.failed} failed")
+        for error in report.errors[:20]:
+            print(f"   ⚠️  Row {error.index}: {'; '.join(error.errors)}")
+        print(f"⏱️  {report.elapsed_seconds}s ({report.rows_per_second} rows/s), process peak RSS {report.process_peak_rss_mb} MB")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Import failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+"""
+Batched transaction writes shared by the bulk endpoint and importers.
+
+Rows are inserted with a single executemany per chunk and folded into the
+category rollups in the same DB transaction; the caller owns the commit.
+Rows given a content hash are inserted with ON CONFLICT DO NOTHING, so a row
+already stored (possibly by a concurrent import) is skipped, not an error.
+"""
+
+import json
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import Transaction, TransactionCreate
+from rollups import dialect_insert, record_transactions
+
+# Rows written per executemany round trip
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "2000"))
+# Per-row errors echoed back in a bulk response; the full count is always reported
+MAX_REPORTED_ERRORS = 1000
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Upload bytes kept in memory before the spool spills to a temp file
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+def insert_transactions(db: Session, user_id: int, transactions: List[TransactionCreate], content_hashes: Optional[List[str]] = None) -> int:
+    """Insert validated transactions for a user in one executemany and update rollups.
+
+    With content_hashes, rows whose hash is already stored are skipped; only
+    the rows actually inserted are counted and added to the rollups.
+    """
+    if not transactions:
+        return 0
+    rows = [dict(tx.to_columns(), user_id=user_id) for tx in transactions]
+    if content_hashes is not None:
+        for row, content_hash in zip(rows, content_hashes):
+            row["content_hash"] = content_hash
+        stmt = dialect_insert(db)(Transaction).on_conflict_do_nothing(
+            index_elements=[Transaction.content_hash]
+        ).returning(Transaction.content_hash)
+        inserted = set(db.execute(stmt, rows).scalars())
+        rows = [row for row in rows if row["content_hash"] in inserted]
+    else:
+        db.execute(insert(Transaction), rows)
+    record_transactions(db, rows)
+    return len(rows)
+
+def validate_record(record) -> Tuple[TransactionCreate, List[str]]:
+    """Validate one decoded record, returning (transaction, []) or (None, error messages)"""
+    try:
+        return TransactionCreate.model_validate(record), []
+    except ValidationError as e:
+        return None, [
+            f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+            for error in e.errors()
+        ]
+
+async def spool_request(request: Request) -> tempfile.SpooledTemporaryFile:
+    """Copy the whole request body into a temp file (in memory until SPOOL_MAX_MEMORY) and rewind it"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+async def iter_request_records(request: Request) -> AsyncIterator[Tuple[int, object, str]]:
+    """Yield (index, record, parse_error) for each row of a JSON array or NDJSON body.
+
+    The body is read in full before the first row is yielded, so the caller
+    can start writing without waiting on a slow upload. NDJSON bodies are
+    spooled and decoded line by line, so memory stays bounded by
+    SPOOL_MAX_MEMORY rather than the upload size.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        with await spool_request(request) as spool:
+            index = 0
+            for line in spool:
+                if line.strip():
+                    yield (index,) + _decode_line(line)
+                    index += 1
+        return
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of transactions")
+    for index, record in enumerate(records):
+        yield index, record, None
+
+def _decode_line(line: bytes) -> Tuple[object, str]:
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
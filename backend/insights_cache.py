@@ -0,0 +1,40 @@
+"""
+Cache of Gemini analyses keyed on a fingerprint of the data they were built from.
+
+An analysis is reused when the same user asks for the same analysis_type and
+their transactions, budgets and savings goals have not changed since, which
+saves seconds of latency and a Gemini call. The fingerprint comes from counts,
+max ids and sums that a single aggregate query returns, so computing it is far
+cheaper than loading the data.
+"""
+
+import hashlib
+import os
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from models import Budget, SavingsGoal, Transaction
+
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "86400"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+
+# (user_id, analysis_type, fingerprint) -> analysis_id
+insights_cache = TTLCache(AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL_SECONDS)
+
+async def data_fingerprint(db: AsyncSession, user_id: int) -> str:
+    """Digest that changes whenever the data behind an analysis changes"""
+    def versions(model, id_column, *sums):
+        return [
+            select(func.count()).where(model.user_id == user_id).scalar_subquery(),
+            select(func.max(id_column)).where(model.user_id == user_id).scalar_subquery(),
+            *[select(func.sum(column)).where(model.user_id == user_id).scalar_subquery() for column in sums],
+        ]
+
+    row = (await db.execute(select(
+        *versions(Transaction, Transaction.transaction_id, Transaction.amount_minor),
+        *versions(Budget, Budget.budget_id, Budget.monthly_budget_minor),
+        *versions(SavingsGoal, SavingsGoal.goal_id, SavingsGoal.current_amount_minor, SavingsGoal.target_amount_minor),
+    ))).one()
+    return hashlib.sha256(repr(tuple(row)).encode()).hexdigest()
@@ -0,0 +1,20 @@
+"""
+Run an app test in a fresh interpreter.
+
+llm_client, metrics and database read their settings from the environment
+when they are first imported, so a test that needs its own settings (the
+Gemini stub's endpoint, a scratch DATABASE_URL) cannot share a process with
+another test that imported main first. Such a test module has a main() that
+sets the environment, imports the app and runs the checks, and its pytest
+test calls run_isolated(__file__) to run the module as a script.
+"""
+
+import os
+import subprocess
+import sys
+
+def run_isolated(path: str, timeout: float = 600):
+    """Run a test module as a script in a new interpreter and fail if it fails"""
+    result = subprocess.run([sys.executable, "-W", "ignore", path], capture_output=True, text=True, timeout=timeout)
+    print(result.stdout)
+    assert result.returncode == 0, f"{os.path.basename(path)} failed:\n{result.stdout[-2000:]}{result.stderr[-2000:]}"
@@ -0,0 +1,352 @@
+"""
+Non-blocking access to Gemini for the async API handlers.
+
+generate_content is a blocking HTTP call that can take several seconds, so it
+runs on a dedicated thread pool instead of the event loop. At most
+GEMINI_MAX_CONCURRENCY calls are in flight; up to GEMINI_MAX_WAITING more may
+wait for a slot, and beyond that LLMBusyError is raised straight away. Each
+call is abandoned after GEMINI_TIMEOUT_SECONDS.
+
+Calls are also kept inside the Gemini quota and protected from outages:
+- a token bucket starts at most GEMINI_RATE_PER_MINUTE calls a minute (bursts
+  of GEMINI_RATE_BURST); a call that would wait longer than
+  GEMINI_RATE_MAX_WAIT_SECONDS for its turn raises LLMRateLimitedError
+- timeouts, 429s, 5xx responses and connection errors are retried up to
+  GEMINI_MAX_RETRIES times with jittered exponential backoff
+- after GEMINI_BREAKER_FAILURES consecutive such errors the circuit breaker
+  opens and calls raise LLMUnavailableError at once, until a trial call
+  succeeds after GEMINI_BREAKER_RESET_SECONDS
+
+One GenerativeModel, built by configure() from GEMINI_MODEL, the
+GEMINI_TEMPERATURE/TOP_P/TOP_K/MAX_OUTPUT_TOKENS generation settings and
+GEMINI_SAFETY_SETTINGS, is shared by every call, as is the SDK's client and its
+keep-alive connections. Over REST the connection pool holds
+GEMINI_MAX_CONCURRENCY connections, so busy threads don't open throwaway ones.
+
+Set GEMINI_API_ENDPOINT to send requests to another server over REST, e.g.
+the local stub in gemini_stub.py for tests and benchmarks.
+"""
+
+import asyncio
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+
+import google.generativeai as genai
+import requests
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import client as genai_client
+from requests.adapters import HTTPAdapter
+
+from metrics import timed_gemini
+from resilience import CircuitBreaker, TokenBucket, backoff_delay
+
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# Unset generation settings keep the model's defaults
+GEMINI_TEMPERATURE = os.getenv("GEMINI_TEMPERATURE")
+GEMINI_TOP_P = os.getenv("GEMINI_TOP_P")
+GEMINI_TOP_K = os.getenv("GEMINI_TOP_K")
+GEMINI_MAX_OUTPUT_TOKENS = os.getenv("GEMINI_MAX_OUTPUT_TOKENS")
+# Comma-separated category=threshold pairs, e.g. "harassment=block_only_high,dangerous=block_medium_and_above"
+GEMINI_SAFETY_SETTINGS = os.getenv("GEMINI_SAFETY_SETTINGS", "")
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_WAITING = int(os.getenv("GEMINI_MAX_WAITING", "32"))
+# Free tier quota for gemini-1.5-flash; 0 disables rate limiting
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "15"))
+GEMINI_RATE_BURST = int(os.getenv("GEMINI_RATE_BURST", "5"))
+GEMINI_RATE_MAX_WAIT_SECONDS = float(os.getenv("GEMINI_RATE_MAX_WAIT_SECONDS", "10"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "0.5"))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "8"))
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+class LLMRejectedError(Exception):
+    """Raised when a Gemini call is refused without being attempted"""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LLMBusyError(LLMRejectedError):
+    """Raised when the wait queue for Gemini calls is full"""
+
+class LLMRateLimitedError(LLMRejectedError):
+    """Raised when the call would have to wait too long for the rate limiter"""
+
+class LLMUnavailableError(LLMRejectedError):
+    """Raised while the circuit breaker is open"""
+
+class LLMTimeoutError(Exception):
+    """Raised when a Gemini call exceeds GEMINI_TIMEOUT_SECONDS"""
+
+# Errors worth retrying, and that count towards opening the breaker. Others,
+# such as an invalid API key or a blocked prompt, show the service is up.
+TRANSIENT_ERRORS = (
+    LLMTimeoutError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServerError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini")
+_slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+_waiting = 0
+_in_flight = 0
+
+def _log_transition(previous: str, state: str):
+    print(f"⚡ Gemini circuit breaker {previous} -> {state}")
+
+_bucket = TokenBucket(GEMINI_RATE_PER_MINUTE, GEMINI_RATE_BURST)
+_breaker = CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS, _log_transition)
+_rejections = Counter()
+_counters = Counter()
+
+_model: Optional[genai.GenerativeModel] = None
+
+def generation_config() -> dict:
+    settings = {
+        "temperature": (GEMINI_TEMPERATURE, float),
+        "top_p": (GEMINI_TOP_P, float),
+        "top_k": (GEMINI_TOP_K, int),
+        "max_output_tokens": (GEMINI_MAX_OUTPUT_TOKENS, int),
+    }
+    return {name: convert(value) for name, (value, convert) in settings.items() if value}
+
+def safety_settings() -> dict:
+    pairs = [pair.split("=", 1) for pair in GEMINI_SAFETY_SETTINGS.split(",") if pair.strip()]
+    return {category.strip(): threshold.strip() for category, threshold in pairs}
+
+def _create_model() -> genai.GenerativeModel:
+    return genai.GenerativeModel(
+        GEMINI_MODEL,
+        generation_config=generation_config() or None,
+        safety_settings=safety_settings() or None,
+    )
+
+def configure(api_key: str):
+    """Configure the Gemini SDK, pointing it at GEMINI_API_ENDPOINT when set, and build the shared model"""
+    global _model
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=api_key)
+
+    # Create the SDK client up front so pool threads don't race to create it
+    _size_connection_pool(genai_client.get_default_generative_client())
+    _model = _create_model()
+
+def _size_connection_pool(client):
+    """Let every thread calling Gemini keep its own HTTP connection.
+
+    requests keeps 10 connections per host by default and closes any extra one
+    after use. The SDK has no option for the pool size, so this mounts an
+    adapter on the REST transport's requests session, a private attribute
+    (checked with google-generativeai 0.8.6 and google-ai-generativelanguage
+    0.6.15, GenerativeServiceRestTransport). The gRPC transport multiplexes
+    calls over one channel and needs nothing. If a newer SDK moves the
+    session, calls still work, only with the default pool.
+    """
+    transport = getattr(client, "transport", None)
+    if transport is None or type(transport).__name__.endswith("GrpcTransport"):
+        return
+    session = getattr(transport, "_session", None)
+    if not isinstance(session, requests.Session):
+        print(f"⚠️  Gemini connection pool not resized: no requests session on {type(transport).__name__}")
+        return
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GEMINI_MAX_CONCURRENCY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+def _get_model() -> genai.GenerativeModel:
+    global _model
+    if _model is None:
+        _model = _create_model()
+    return _model
+
+# The timeout is slightly longer than the wait in generate(), which then reports
+# it; this only stops an abandoned HTTP request from holding a worker thread.
+# The SDK's own retries are off: they would hide failures from the breaker.
+_REQUEST_OPTIONS = {"timeout": GEMINI_TIMEOUT_SECONDS + 1, "retry": None}
+
+def _generate_blocking(prompt: str) -> str:
+    response = _get_model().generate_content(prompt, request_options=_REQUEST_OPTIONS)
+    return response.text
+
+def _breaker_rejection() -> LLMUnavailableError:
+    _rejections["breaker_open"] += 1
+    return LLMUnavailableError(
+        "AI service is temporarily unavailable, please retry shortly",
+        retry_after=_breaker.retry_after() or GEMINI_BREAKER_RESET_SECONDS,
+    )
+
+def ensure_capacity():
+    """Raise an LLMRejectedError if a new call would have to be rejected right now"""
+    if _breaker.retry_after() > 0:
+        raise _breaker_rejection()
+    if _slots.locked() and _waiting >= GEMINI_MAX_WAITING:
+        _rejections["queue_full"] += 1
+        raise LLMBusyError("AI service is busy, please retry shortly")
+
+async def _acquire_slot():
+    global _waiting, _in_flight
+    ensure_capacity()
+    _waiting += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _waiting -= 1
+    _in_flight += 1
+
+def _release_slot():
+    global _in_flight
+    _in_flight -= 1
+    _slots.release()
+
+async def _admit():
+    """Wait for a rate limiter token and the breaker's go-ahead for one attempt"""
+    wait = _bucket.reserve(GEMINI_RATE_MAX_WAIT_SECONDS)
+    if wait is None:
+        _rejections["rate_limited"] += 1
+        raise LLMRateLimitedError("AI request quota reached, please retry shortly", retry_after=GEMINI_RATE_MAX_WAIT_SECONDS)
+    if wait:
+        await asyncio.sleep(wait)
+    if not _breaker.allow():
+        raise _breaker_rejection()
+
+def _record(error: Optional[Exception]) -> bool:
+    """Report an attempt's outcome to the breaker; True if the error is worth retrying"""
+    if error is None or not isinstance(error, TRANSIENT_ERRORS):
+        _breaker.record_success()
+        return False
+    _counters["transient_errors"] += 1
+    _breaker.record_failure()
+    return True
+
+async def _backoff(attempt: int):
+    _counters["retries"] += 1
+    await asyncio.sleep(backoff_delay(attempt, GEMINI_RETRY_BASE_SECONDS, GEMINI_RETRY_MAX_SECONDS))
+
+@timed_gemini
+async def generate(prompt: str) -> str:
+    """Generate a response for prompt without blocking the event loop"""
+    await _acquire_slot()
+    try:
+        attempt = 0
+        while True:
+            await _admit()
+            try:
+                future = asyncio.get_running_loop().run_in_executor(_executor, _generate_blocking, prompt)
+                text = await asyncio.wait_for(future, GEMINI_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                error = LLMTimeoutError(f"Gemini did not respond within {GEMINI_TIMEOUT_SECONDS:g}s")
+            except Exception as e:
+                error = e
+            except BaseException:
+                # Cancelled, e.g. the client disconnected: there is no outcome to record
+                _breaker.release()
+                raise
+            else:
+                _record(None)
+                return text
+            if not _record(error) or attempt >= GEMINI_MAX_RETRIES:
+                raise error
+            await _backoff(attempt)
+            attempt += 1
+    finally:
+        _release_slot()
+
+_STREAM_END = object()
+
+def _stream_blocking(prompt: str, loop, queue: asyncio.Queue, cancelled: threading.Event):
+    """Iterate a streaming response on a pool thread, handing each piece to the loop"""
+    def put(item):
+        # Nobody is listening once the consumer has gone, and its loop may be closed
+        if not cancelled.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    try:
+        response = _get_model().generate_content(prompt, stream=True, request_options=_REQUEST_OPTIONS)
+        for chunk in response:
+            if cancelled.is_set():
+                break
+            put(chunk.text)
+        put(_STREAM_END)
+    except Exception as e:
+        put(e)
+
+async def _stream_once(prompt: str) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+    try:
+        loop.run_in_executor(_executor, _stream_blocking, prompt, loop, queue, cancelled)
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), GEMINI_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Gemini did not respond within {GEMINI_TIMEOUT_SECONDS:g}s")
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Stop the worker thread early if the client went away
+        cancelled.set()
+
+@timed_gemini
+async def stream(prompt: str) -> AsyncIterator[str]:
+    """Yield the response text piece by piece as Gemini produces it.
+
+    GEMINI_TIMEOUT_SECONDS bounds the wait for each piece rather than the
+    whole response, so long answers can keep streaming. A failed call is only
+    retried if nothing has been yielded yet.
+    """
+    await _acquire_slot()
+    try:
+        attempt = 0
+        while True:
+            await _admit()
+            received = False
+            try:
+                async with aclosing(_stream_once(prompt)) as pieces:
+                    async for piece in pieces:
+                        received = True
+                        yield piece
+                error = None
+            except Exception as e:
+                error = e
+            except BaseException:
+                # The consumer stopped early; text arriving shows the service is up
+                if received:
+                    _breaker.record_success()
+                else:
+                    _breaker.release()
+                raise
+            retry = _record(error)
+            if error is None:
+                return
+            if received or not retry or attempt >= GEMINI_MAX_RETRIES:
+                raise error
+            await _backoff(attempt)
+            attempt += 1
+    finally:
+        _release_slot()
+
+def stats() -> dict:
+    return {
+        "in_flight": _in_flight,
+        "waiting": _waiting,
+        "breaker_state": _breaker.state,
+        "breaker_transitions": dict(_breaker.transitions),
+        "rejections": {reason: _rejections[reason] for reason in ("queue_full", "rate_limited", "breaker_open")},
+        "retries": _counters["retries"],
+        "transient_errors": _counters["transient_errors"],
+    }
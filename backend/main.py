@@ -1,24 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
+from contextlib import asynccontextmanager
 import uvicorn
+import math
 import os
 from datetime import timedelta, datetime
+from sqlalchemy import func, case, select
 
 from dotenv import load_dotenv
 load_dotenv() 
 
 # Import local modules
-from database import get_db, engine
+from database import get_db, engine, async_engine, SessionLocal, begin_write, migrate_minor_units, upgrade_schema
 import models
-from models import User, Account, Budget, Transaction, SavingsGoal, AIAnalysis, ChatMessage
-from ai_service import generate_financial_insights, process_chat_message
+from models import User, Account, Budget, Transaction, SavingsGoal, AIAnalysis, AIJob, ChatMessage
+from ai_service import process_chat_message, stream_chat_message
+from analysis import run_analysis
+from ai_jobs import enqueue_analysis, start_workers, stop_workers
+import llm_client
+import metrics
+from llm_client import LLMRejectedError, ensure_capacity
+from chat_stream import SSE_HEADERS, chat_events
+from chat_context import build_chat_history, normalize_chat_timestamps, refresh_summary
+from insights_cache import insights_cache
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, keyset_after
+from rollups import record_transaction, get_spending_totals, ensure_rollups
+from prompt_context import build_prompt_context
+from ingest import BULK_CHUNK_SIZE, MAX_REPORTED_ERRORS, insert_transactions, iter_request_records, validate_record
+from export import COLUMNAR_FORMATS, EXPORT_MEDIA_TYPES, columnar_available, stream_transactions
+from money import DEFAULT_CURRENCY, from_minor, to_minor
+from search import ensure_search_index, search_query, search_terms
+from importer import import_statement, spool_request_body, DEFAULT_CATEGORY, DEFAULT_PAYMENT_METHOD
+from user_cache import user_cache
 from auth import (
     authenticate_user, 
     create_access_token, 
     get_current_active_user, 
-    get_password_hash,
+    get_password_hash_async,
+    token_cache,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
@@ -26,7 +50,16 @@ from auth import (
 def create_tables():
     try:
         models.Base.metadata.create_all(bind=engine)
+        upgrade_schema()
+        migrate_minor_units()
+        ensure_search_index(engine)
         print("✅ Database tables created successfully")
+        db = SessionLocal()
+        try:
+            ensure_rollups(db)
+            normalize_chat_timestamps(db)
+        finally:
+            db.close()
     except Exception as e:
         print(f"❌ Error creating database tables: {e}")
         print("This might be due to database locking. Please try again.")
@@ -34,8 +67,16 @@ def create_tables():
 # Create tables on startup
 create_tables()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_workers = start_workers()
+    yield
+    await stop_workers(job_workers)
+    # Close pooled async connections so their driver threads let the process exit
+    await async_engine.dispose()
+
 # Initialize FastAPI app
-app = FastAPI(title="FlexiFi Budget API", description="Backend API for FlexiFi Budget App")
+app = FastAPI(title="FlexiFi Budget API", description="Backend API for FlexiFi Budget App", lifespan=lifespan)
 
 # Set up CORS middleware to allow frontend to access API
 app.add_middleware(
@@ -44,19 +85,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Request latency, status and size histograms for /metrics; before any route is declared
+metrics.install(app, async_engine.sync_engine, engine)
+
 # No need for oauth2_scheme here as it's defined in auth.py
 
+# AI call refused (queue full, quota used up or circuit breaker open): shed load
+# instead of piling up waiters
+@app.exception_handler(LLMRejectedError)
+async def llm_rejected_handler(request: Request, exc: LLMRejectedError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
 # Root endpoint
 @app.get("/")
 async def root():
     return {"message": "Welcome to FlexiFi Budget API"}
 
+# Cache hit rates and the lookup time they saved
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "user_cache": user_cache.stats.snapshot(),
+        "token_cache": token_cache.stats.snapshot(),
+        "insights_cache": insights_cache.stats.snapshot(),
+    }
+
+# Gemini call queue, retries, rate limiter rejections and circuit breaker state
+@app.get("/ai-stats")
+async def ai_stats():
+    return llm_client.stats()
+
+# Prometheus metrics: per-route latency, in-flight requests, status codes and
+# response sizes, DB/Gemini/serialization time, plus the AI and cache stats above
+@app.get("/metrics")
+async def prometheus_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return Response(metrics.render(llm_client.stats(), await cache_stats()), media_type=metrics.CONTENT_TYPE)
+
 # Authentication endpoints
 @app.post("/token", response_model=models.Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -68,181 +145,380 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(g
     access_token = create_access_token(
         data={"sub": str(user.user_id)}, expires_delta=access_token_expires
     )
-    
-    # Debug logging
-    print(f"Login successful for user {user.user_id}")
-    print(f"Generated token: {access_token[:20]}...")
-    
     return {"access_token": access_token, "token_type": "bearer"}
 
 # User endpoints
 @app.post("/users/", response_model=models.UserResponse)
 async def create_user(user: models.UserCreate, db = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = User(
         name=user.name,
         email=user.email,
         password_hash=hashed_password
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @app.get("/users/me", response_model=models.UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: models.UserResponse = Depends(get_current_active_user)):
     return current_user
 
 # Account endpoints
 @app.post("/accounts/", response_model=models.AccountResponse)
-async def create_account(account: models.AccountCreate, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    new_account = Account(
-        user_id=current_user.user_id,
-        account_number=account.account_number,
-        current_balance=account.current_balance
-    )
+async def create_account(account: models.AccountCreate, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    new_account = Account(user_id=current_user.user_id, **account.to_columns())
     db.add(new_account)
-    db.commit()
-    db.refresh(new_account)
+    await db.commit()
+    await db.refresh(new_account)
 
     # Record initial balance as an income transaction to seed analytics/AI
     try:
-        if account.current_balance and account.current_balance > 0:
+        if new_account.current_balance_minor and new_account.current_balance_minor > 0:
             initial_tx = Transaction(
                 user_id=current_user.user_id,
-                amount=account.current_balance,
+                amount_minor=new_account.current_balance_minor,
+                currency=new_account.currency,
                 category="Income",
                 description="Initial balance",
                 date=datetime.utcnow(),
                 payment_method="Bank"
             )
+            await db.run_sync(begin_write)
             db.add(initial_tx)
-            db.commit()
+            await db.run_sync(record_transaction, initial_tx)
+            await db.commit()
     except Exception:
         # Do not block account creation if this auxiliary step fails
-        db.rollback()
+        await db.rollback()
     return new_account
 
 @app.get("/accounts/", response_model=List[models.AccountResponse])
-async def read_accounts(current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    accounts = db.query(Account).filter(Account.user_id == current_user.user_id).all()
+async def read_accounts(current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    accounts = (await db.execute(select(Account).where(Account.user_id == current_user.user_id))).scalars().all()
     return accounts
 
 @app.put("/accounts/{account_id}", response_model=models.AccountResponse)
-async def update_account_balance(account_id: int, balance: float, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    account = db.query(Account).filter(Account.account_id == account_id, Account.user_id == current_user.user_id).first()
+async def update_account_balance(account_id: int, balance: float, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    account = (await db.execute(
+        select(Account).where(Account.account_id == account_id, Account.user_id == current_user.user_id)
+    )).scalars().first()
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    account.current_balance = balance
-    db.commit()
-    db.refresh(account)
+    account.current_balance_minor = minor_amount(balance, account.currency)
+    await db.commit()
+    await db.refresh(account)
     return account
 
 # Budget endpoints
 @app.post("/budgets/", response_model=models.BudgetResponse)
-async def create_budget(budget: models.BudgetCreate, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    new_budget = Budget(
-        user_id=current_user.user_id,
-        monthly_budget=budget.monthly_budget,
-        start_date=budget.start_date,
-        end_date=budget.end_date
-    )
+async def create_budget(budget: models.BudgetCreate, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    new_budget = Budget(user_id=current_user.user_id, **budget.to_columns())
     db.add(new_budget)
-    db.commit()
-    db.refresh(new_budget)
+    await db.commit()
+    await db.refresh(new_budget)
     return new_budget
 
 @app.get("/budgets/", response_model=List[models.BudgetResponse])
-async def read_budgets(current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    budgets = db.query(Budget).filter(Budget.user_id == current_user.user_id).all()
+async def read_budgets(current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    budgets = (await db.execute(select(Budget).where(Budget.user_id == current_user.user_id))).scalars().all()
     return budgets
 
+def minor_amount(amount: float, currency: str = DEFAULT_CURRENCY) -> int:
+    """to_minor for amounts from query parameters, rejecting ones that do not fit with a 422"""
+    try:
+        return to_minor(amount, currency)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 # Transaction endpoints
+def transaction_filters(start_date, end_date, category, payment_method, min_amount, max_amount, direction=None):
+    """WHERE clauses for the optional transaction list/export filters"""
+    conditions = []
+    if direction == "debit":
+        conditions.append(Transaction.amount_minor < 0)
+    elif direction == "credit":
+        conditions.append(Transaction.amount_minor > 0)
+    if start_date is not None:
+        conditions.append(Transaction.date >= start_date)
+    if end_date is not None:
+        conditions.append(Transaction.date <= end_date)
+    if category is not None:
+        conditions.append(Transaction.category == category)
+    if payment_method is not None:
+        conditions.append(Transaction.payment_method == payment_method)
+    if min_amount is not None:
+        conditions.append(Transaction.amount_minor >= minor_amount(min_amount))
+    if max_amount is not None:
+        conditions.append(Transaction.amount_minor <= minor_amount(max_amount))
+    return conditions
+
 @app.post("/transactions/", response_model=models.TransactionResponse)
-async def create_transaction(transaction: models.TransactionCreate, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    new_transaction = Transaction(
-        user_id=current_user.user_id,
-        amount=transaction.amount,
-        category=transaction.category,
-        description=transaction.description,
-        date=transaction.date,
-        payment_method=transaction.payment_method
-    )
+async def create_transaction(transaction: models.TransactionCreate, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    new_transaction = Transaction(user_id=current_user.user_id, **transaction.to_columns())
+    await db.run_sync(begin_write)
     db.add(new_transaction)
-    db.commit()
-    db.refresh(new_transaction)
+    await db.run_sync(record_transaction, new_transaction)
+    await db.commit()
+    await db.refresh(new_transaction)
     return new_transaction
 
+@app.post("/transactions/bulk", response_model=models.BulkInsertResponse)
+async def create_transactions_bulk(request: Request, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    # Accepts a JSON array or an NDJSON stream; valid rows are inserted in chunks
+    # inside a single DB transaction and invalid rows are reported by index
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+    try:
+        async for index, record, parse_error in iter_request_records(request):
+            if parse_error is None:
+                transaction, row_errors = validate_record(record)
+            else:
+                transaction, row_errors = None, [parse_error]
+            if row_errors:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(models.BulkRowError(index=index, errors=row_errors))
+                continue
+            batch.append(transaction)
+            if len(batch) >= BULK_CHUNK_SIZE:
+                # iter_request_records has read the whole body by now, so the write
+                # lock is never held while waiting on the client
+                await db.run_sync(begin_write)
+                inserted += await db.run_sync(insert_transactions, current_user.user_id, batch)
+                batch = []
+        if batch:
+            await db.run_sync(begin_write)
+            inserted += await db.run_sync(insert_transactions, current_user.user_id, batch)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return models.BulkInsertResponse(inserted=inserted, failed=failed, errors=errors)
+
+@app.post("/transactions/import", response_model=models.ImportReport)
+async def import_transactions(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    default_category: str = DEFAULT_CATEGORY,
+    default_payment_method: str = DEFAULT_PAYMENT_METHOD,
+    current_user: models.UserResponse = Depends(get_current_active_user)
+):
+    # The statement is sent as the raw request body (text/csv or application/x-ndjson)
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+
+    stream = await spool_request_body(request)
+    try:
+        # Parsing, validation and the batch inserts run in a worker thread on a
+        # sync session, so a large statement does not hold up the event loop
+        return await run_in_threadpool(
+            _import_statement, current_user.user_id, stream, format, default_category, default_payment_method
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Statement must be UTF-8 encoded")
+    finally:
+        stream.close()
+
+def _import_statement(user_id: int, stream, fmt: str, default_category: str, default_payment_method: str) -> models.ImportReport:
+    # Closing the session rolls back a batch left uncommitted by an error
+    with SessionLocal() as db:
+        return import_statement(db, user_id, stream, fmt, default_category, default_payment_method)
+
+@app.get("/transactions/export")
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet|arrow)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    direction: Optional[str] = Query(None, pattern="^(debit|credit)$"),
+    current_user: models.UserResponse = Depends(get_current_active_user)
+):
+    if format in COLUMNAR_FORMATS and not columnar_available():
+        raise HTTPException(status_code=400, detail=f"{format} export requires pyarrow to be installed")
+
+    conditions = transaction_filters(start_date, end_date, category, payment_method, min_amount, max_amount, direction)
+    return StreamingResponse(
+        stream_transactions(current_user.user_id, conditions, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    )
+
+@app.get("/transactions/search", response_model=List[models.TransactionResponse])
+async def search_transactions(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=200),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    direction: Optional[str] = Query(None, pattern="^(debit|credit)$"),
+    current_user: models.UserResponse = Depends(get_current_active_user),
+    db = Depends(get_db)
+):
+    """Transactions whose description or category match every word of q, best matches first"""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    conditions = transaction_filters(start_date, end_date, category, payment_method, min_amount, max_amount, direction)
+    query = search_query(db.get_bind().dialect.name, current_user.user_id, terms, conditions, limit)
+    return (await db.execute(query)).scalars().all()
+
 @app.get("/transactions/", response_model=List[models.TransactionResponse])
-async def read_transactions(current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    transactions = db.query(Transaction).filter(Transaction.user_id == current_user.user_id).all()
+async def read_transactions(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    direction: Optional[str] = Query(None, pattern="^(debit|credit)$"),
+    current_user: models.UserResponse = Depends(get_current_active_user),
+    db = Depends(get_db)
+):
+    # Newest first; ties on date are broken by transaction_id so the keyset is stable
+    query = select(Transaction).where(
+        Transaction.user_id == current_user.user_id,
+        *transaction_filters(start_date, end_date, category, payment_method, min_amount, max_amount, direction)
+    )
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        query = query.where(keyset_after(Transaction.date, Transaction.transaction_id, position))
+    query = query.order_by(Transaction.date.desc(), Transaction.transaction_id.desc())
+
+    # Without a limit the whole (filtered) history is returned, as before
+    if limit is None:
+        return (await db.execute(query)).scalars().all()
+
+    transactions = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.date, last.transaction_id)
     return transactions
 
+# Dashboard summary endpoint
+@app.get("/summary", response_model=models.DashboardSummary)
+async def read_summary(current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    user_id = current_user.user_id
+
+    # Income/expense totals in a single pass over the user's transactions; all
+    # sums are exact integers in minor units, converted once for the response
+    income, expenses, transaction_count = (await db.execute(select(
+        func.coalesce(func.sum(case((Transaction.amount_minor > 0, Transaction.amount_minor), else_=0)), 0),
+        func.coalesce(func.sum(case((Transaction.amount_minor < 0, -Transaction.amount_minor), else_=0)), 0),
+        func.count(Transaction.transaction_id)
+    ).where(Transaction.user_id == user_id))).one()
+
+    spent = func.sum(-Transaction.amount_minor).label("spent")
+    category_rows = (await db.execute(select(Transaction.category, spent).where(
+        Transaction.user_id == user_id, Transaction.amount_minor < 0
+    ).group_by(Transaction.category).order_by(spent.desc()))).all()
+
+    account_balance, account_count = (await db.execute(select(
+        func.coalesce(func.sum(Account.current_balance_minor), 0),
+        func.count(Account.account_id)
+    ).where(Account.user_id == user_id))).one()
+
+    # The most recently created budget is the active one
+    budget = (await db.execute(select(Budget.monthly_budget_minor, Budget.currency).where(Budget.user_id == user_id).order_by(
+        Budget.created_at.desc(), Budget.budget_id.desc()
+    ))).first()
+
+    goal_rows = (await db.execute(select(
+        SavingsGoal.goal_id, SavingsGoal.goal_name, SavingsGoal.target_amount_minor, SavingsGoal.current_amount_minor,
+        SavingsGoal.currency
+    ).where(SavingsGoal.user_id == user_id))).all()
+    goals = [
+        models.GoalProgress(
+            goal_id=goal.goal_id,
+            goal_name=goal.goal_name,
+            target_amount=from_minor(goal.target_amount_minor, goal.currency),
+            current_amount=from_minor(goal.current_amount_minor or 0, goal.currency),
+            progress_percentage=((goal.current_amount_minor or 0) / goal.target_amount_minor) * 100 if goal.target_amount_minor > 0 else 0
+        )
+        for goal in goal_rows
+    ]
+
+    return models.DashboardSummary(
+        income=from_minor(income),
+        expenses=from_minor(expenses),
+        transaction_count=transaction_count,
+        account_balance=from_minor(account_balance),
+        account_count=account_count,
+        budget=from_minor(budget.monthly_budget_minor, budget.currency) if budget else None,
+        savings=from_minor(sum(goal.current_amount_minor or 0 for goal in goal_rows)),
+        savings_goal=from_minor(sum(goal.target_amount_minor for goal in goal_rows)),
+        expense_categories=[models.CategoryTotal(name=name, amount=from_minor(amount)) for name, amount in category_rows],
+        goals=goals
+    )
+
 # Savings Goal endpoints
 @app.post("/savings-goals/", response_model=models.SavingsGoalResponse)
-async def create_savings_goal(savings_goal: models.SavingsGoalCreate, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    new_savings_goal = SavingsGoal(
-        user_id=current_user.user_id,
-        goal_name=savings_goal.goal_name,
-        target_amount=savings_goal.target_amount,
-        current_amount=savings_goal.current_amount,
-        deadline=savings_goal.deadline
-    )
+async def create_savings_goal(savings_goal: models.SavingsGoalCreate, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    new_savings_goal = SavingsGoal(user_id=current_user.user_id, **savings_goal.to_columns())
     db.add(new_savings_goal)
-    db.commit()
-    db.refresh(new_savings_goal)
+    await db.commit()
+    await db.refresh(new_savings_goal)
     return new_savings_goal
 
 @app.get("/savings-goals/", response_model=List[models.SavingsGoalResponse])
-async def read_savings_goals(current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    savings_goals = db.query(SavingsGoal).filter(SavingsGoal.user_id == current_user.user_id).all()
+async def read_savings_goals(current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    savings_goals = (await db.execute(select(SavingsGoal).where(SavingsGoal.user_id == current_user.user_id))).scalars().all()
     return savings_goals
 
 # AI Analysis endpoints
 @app.post("/ai-analysis/", response_model=models.AIAnalysisResponse)
-async def create_ai_analysis(analysis_type: str, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    # Get user's transactions
-    transactions = db.query(Transaction).filter(Transaction.user_id == current_user.user_id).all()
-    
-    # Get user's budget
-    budget = db.query(Budget).filter(Budget.user_id == current_user.user_id).first()
-    
-    # Get user's savings goals
-    savings_goals = db.query(SavingsGoal).filter(SavingsGoal.user_id == current_user.user_id).all()
-    
-    # Generate insights using Gemini API
-    insights = generate_financial_insights(
-        transactions=transactions,
-        budget=budget,
-        savings_goals=savings_goals,
-        analysis_type=analysis_type
-    )
-    
-    # Save analysis to database
-    new_analysis = AIAnalysis(
-        user_id=current_user.user_id,
-        analysis_type=analysis_type,
-        result=insights
-    )
-    db.add(new_analysis)
-    db.commit()
-    db.refresh(new_analysis)
-    
-    return new_analysis
+async def create_ai_analysis(analysis_type: str, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    return await run_analysis(db, current_user.user_id, analysis_type)
+
+@app.post("/ai-analysis/jobs", response_model=models.AIJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_ai_analysis_job(analysis_type: str, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    return await enqueue_analysis(db, current_user.user_id, analysis_type)
+
+@app.get("/ai-analysis/jobs/{job_id}", response_model=models.AIJobResponse)
+async def read_ai_analysis_job(job_id: int, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    job = (await db.execute(
+        select(AIJob).where(AIJob.job_id == job_id, AIJob.user_id == current_user.user_id)
+    )).scalars().first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    response = models.AIJobResponse.model_validate(job)
+    if job.analysis_id is not None:
+        response.analysis = models.AIAnalysisResponse.model_validate(await db.get(AIAnalysis, job.analysis_id))
+    return response
 
 @app.get("/ai-analysis/", response_model=List[models.AIAnalysisResponse])
-async def read_ai_analyses(current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    analyses = db.query(AIAnalysis).filter(AIAnalysis.user_id == current_user.user_id).all()
+async def read_ai_analyses(current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    analyses = (await db.execute(select(AIAnalysis).where(AIAnalysis.user_id == current_user.user_id))).scalars().all()
     return analyses
 
 # Chat endpoints
 @app.post("/chat/", response_model=models.ChatMessageResponse)
-async def create_chat_message(message: models.ChatMessageCreate, current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
+async def create_chat_message(message: models.ChatMessageCreate, background_tasks: BackgroundTasks, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    # Reject before the user message is saved, so a refused call leaves no unanswered message
+    ensure_capacity()
+    
     # Save user message
     user_message = ChatMessage(
         user_id=current_user.user_id,
@@ -250,21 +526,37 @@ async def create_chat_message(message: models.ChatMessageCreate, current_user: U
         content=message.content
     )
     db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    await db.commit()
+    await db.refresh(user_message)
+    
+    # Earlier conversation: summary of older messages plus the most recent ones
+    history = await build_chat_history(db, current_user.user_id, before_message_id=user_message.message_id)
     
-    # Get user's transactions, budget, and savings goals for context
-    transactions = db.query(Transaction).filter(Transaction.user_id == current_user.user_id).all()
-    budget = db.query(Budget).filter(Budget.user_id == current_user.user_id).first()
-    savings_goals = db.query(SavingsGoal).filter(SavingsGoal.user_id == current_user.user_id).all()
+    # Get a summary of the user's transactions, budget, and savings goals for context
+    context = await db.run_sync(build_prompt_context, current_user.user_id)
+    budget = (await db.execute(select(Budget).where(Budget.user_id == current_user.user_id))).scalars().first()
+    savings_goals = (await db.execute(select(SavingsGoal).where(SavingsGoal.user_id == current_user.user_id))).scalars().all()
+    totals = await db.run_sync(get_spending_totals, current_user.user_id)
+    
+    # End the read transaction so no connection or snapshot is held during the AI call
+    await db.commit()
     
     # Generate AI response
-    ai_response_text = process_chat_message(
-        user_message=message.content,
-        transactions=transactions,
-        budget=budget,
-        savings_goals=savings_goals
-    )
+    try:
+        ai_response_text = await process_chat_message(
+            user_message=message.content,
+            transactions=None,
+            context=context["text"],
+            budget=budget,
+            savings_goals=savings_goals,
+            totals=totals,
+            history=history
+        )
+    except LLMRejectedError:
+        # The breaker or limiter refused the call after the check above
+        await db.delete(user_message)
+        await db.commit()
+        raise
     
     # Save AI response
     ai_message = ChatMessage(
@@ -273,16 +565,83 @@ async def create_chat_message(message: models.ChatMessageCreate, current_user: U
         content=ai_response_text
     )
     db.add(ai_message)
-    db.commit()
-    db.refresh(ai_message)
+    await db.commit()
+    await db.refresh(ai_message)
+    
+    # Fold older messages into the conversation summary after responding
+    background_tasks.add_task(refresh_summary, current_user.user_id)
     
     # Return the AI response
     return ai_message
 
+@app.post("/chat/stream")
+async def create_chat_message_stream(message: models.ChatMessageCreate, current_user: models.UserResponse = Depends(get_current_active_user), db = Depends(get_db)):
+    # Reject while we can still answer 503, before the stream has started
+    ensure_capacity()
+    
+    # Save user message
+    user_message = ChatMessage(
+        user_id=current_user.user_id,
+        is_user=1,
+        content=message.content
+    )
+    db.add(user_message)
+    await db.commit()
+    
+    # Earlier conversation: summary of older messages plus the most recent ones
+    history = await build_chat_history(db, current_user.user_id, before_message_id=user_message.message_id)
+    
+    # Get a summary of the user's transactions, budget, and savings goals for context
+    context = await db.run_sync(build_prompt_context, current_user.user_id)
+    budget = (await db.execute(select(Budget).where(Budget.user_id == current_user.user_id))).scalars().first()
+    savings_goals = (await db.execute(select(SavingsGoal).where(SavingsGoal.user_id == current_user.user_id))).scalars().all()
+    totals = await db.run_sync(get_spending_totals, current_user.user_id)
+    await db.commit()
+    
+    # Stream the AI response as Server-Sent Events; it is saved once complete
+    pieces = stream_chat_message(
+        user_message=message.content,
+        transactions=None,
+        context=context["text"],
+        budget=budget,
+        savings_goals=savings_goals,
+        totals=totals,
+        history=history
+    )
+    return StreamingResponse(
+        chat_events(current_user.user_id, user_message.message_id, pieces),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+        background=BackgroundTask(refresh_summary, current_user.user_id),
+    )
+
 @app.get("/chat/", response_model=List[models.ChatMessageResponse])
-async def read_chat_messages(current_user: User = Depends(get_current_active_user), db = Depends(get_db)):
-    messages = db.query(ChatMessage).filter(ChatMessage.user_id == current_user.user_id).order_by(ChatMessage.created_at).all()
-    return messages
+async def read_chat_messages(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_user: models.UserResponse = Depends(get_current_active_user),
+    db = Depends(get_db)
+):
+    # Messages are returned oldest first; ties on created_at are broken by message_id
+    query = select(ChatMessage).where(ChatMessage.user_id == current_user.user_id)
+
+    # Without a limit the whole history is returned, as before
+    if limit is None:
+        return (await db.execute(query.order_by(ChatMessage.created_at, ChatMessage.message_id))).scalars().all()
+
+    # With a limit the first page holds the newest messages, and the cursor in
+    # X-Next-Cursor fetches the page of older messages before it
+    position = decode_cursor(cursor)
+    if position is not None:
+        query = query.where(keyset_after(ChatMessage.created_at, ChatMessage.message_id, position))
+    query = query.order_by(ChatMessage.created_at.desc(), ChatMessage.message_id.desc())
+    messages = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(messages) > limit:
+        messages = messages[:limit]
+        oldest = messages[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(oldest.created_at, oldest.message_id)
+    return list(reversed(messages))
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,323 @@
+"""
+Request metrics in Prometheus text format, served by GET /metrics.
+
+MetricsMiddleware times every request and records, per method and route
+template:
+- a latency histogram, the status codes and a response size histogram
+- time spent in database statements, in Gemini calls and in serialization
+  (from the endpoint returning to the response starting: response_model
+  validation and JSON encoding)
+MetricsRoute keeps a per-route count of requests in flight.
+
+Each request's database and Gemini time is collected in a ContextVar, filled
+by engine events and by the Gemini calls in llm_client (timed_gemini).
+Outside a request, e.g. in background AI jobs, nothing is recorded.
+
+Set METRICS_ENABLED=false to leave the middleware, route class and engine
+events out entirely; the decorator then only looks up an unset ContextVar.
+Counters live in the process, so each uvicorn worker reports its own.
+"""
+
+import functools
+import inspect
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import aclosing
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Requests that matched no route share one label, so scanners can't add series
+UNMATCHED_ROUTE = "unmatched"
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        # Buckets are upper bounds (le), so a value equal to a bound falls in it
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class RequestTimings:
+    """Time one request has spent in each phase so far"""
+    __slots__ = ("db", "db_queries", "gemini", "endpoint_done", "finished")
+
+    def __init__(self):
+        self.db = 0.0
+        self.db_queries = 0
+        self.gemini = 0.0
+        self.endpoint_done = None
+        # Set once the response is sent; background tasks after that are not counted
+        self.finished = False
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+_lock = threading.Lock()
+_requests = Counter()  # (method, route, status) -> requests
+_durations = defaultdict(lambda: Histogram(LATENCY_BUCKETS))  # (method, route)
+_sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))  # (method, route)
+_phases = defaultdict(lambda: Histogram(LATENCY_BUCKETS))  # (method, route, phase)
+_db_queries = Counter()  # (method, route) -> statements
+_in_flight = Counter()  # (method, route) -> requests being handled
+
+def _open_timings() -> Optional[RequestTimings]:
+    timings = _current.get()
+    return None if timings is None or timings.finished else timings
+
+def _record(method: str, route: str, status: int, size: int, seconds: float, timings: RequestTimings, serialization: Optional[float]):
+    key = (method, route)
+    with _lock:
+        _requests[(method, route, str(status))] += 1
+        _durations[key].observe(seconds)
+        _sizes[key].observe(size)
+        if timings.db_queries:
+            _db_queries[key] += timings.db_queries
+            _phases[(method, route, "db")].observe(timings.db)
+        if timings.gemini:
+            _phases[(method, route, "gemini")].observe(timings.gemini)
+        if serialization is not None:
+            _phases[(method, route, "serialization")].observe(serialization)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status, size and phase times for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = perf_counter()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        response = {"status": 500, "size": 0, "serialization": None}
+
+        def finish():
+            timings.finished = True
+            # The router adds the matched route to the scope
+            route = scope.get("route")
+            _record(scope["method"], route.path if route else UNMATCHED_ROUTE, response["status"],
+                    response["size"], perf_counter() - started, timings, response["serialization"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                if timings.endpoint_done is not None:
+                    response["serialization"] = perf_counter() - timings.endpoint_done
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+                if not message.get("more_body", False) and not timings.finished:
+                    await send(message)
+                    finish()
+                    return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Not finished if the app raised or the client went away mid-response
+            if not timings.finished:
+                finish()
+            _current.reset(token)
+
+def _mark_endpoint_done(call):
+    """Wrap an endpoint so the request notes when it returned, before serialization"""
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                timings = _current.get()
+                if timings is not None:
+                    timings.endpoint_done = perf_counter()
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            try:
+                return call(*args, **kwargs)
+            finally:
+                timings = _current.get()
+                if timings is not None:
+                    timings.endpoint_done = perf_counter()
+    return endpoint
+
+class MetricsRoute(APIRoute):
+    """APIRoute counting its requests in flight and marking when its endpoint returns"""
+
+    def get_route_handler(self):
+        self.dependant.call = _mark_endpoint_done(self.dependant.call)
+        return super().get_route_handler()
+
+    async def handle(self, scope, receive, send):
+        key = (scope["method"], self.path)
+        _in_flight[key] += 1
+        try:
+            await super().handle(scope, receive, send)
+        finally:
+            _in_flight[key] -= 1
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _open_timings() is not None:
+        conn.info["metrics_statement_started"] = perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("metrics_statement_started", None)
+    timings = _open_timings()
+    if started is not None and timings is not None:
+        timings.db += perf_counter() - started
+        timings.db_queries += 1
+
+def instrument_engine(sync_engine):
+    """Add each statement's execution time to the request that sent it"""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+def _add_gemini(seconds: float):
+    timings = _open_timings()
+    if timings is not None:
+        timings.gemini += seconds
+
+def timed_gemini(func):
+    """Add a coroutine's or async generator's wall time, queueing and retries included, to the request's Gemini time"""
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                async with aclosing(func(*args, **kwargs)) as items:
+                    async for item in items:
+                        yield item
+            finally:
+                _add_gemini(perf_counter() - started)
+    else:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _add_gemini(perf_counter() - started)
+    return wrapper
+
+def install(app, *sync_engines):
+    """Add the middleware, route class and engine events unless METRICS_ENABLED is off.
+
+    Call before declaring routes, so they are created as MetricsRoute.
+    """
+    if not METRICS_ENABLED:
+        return
+    app.router.route_class = MetricsRoute
+    app.add_middleware(MetricsMiddleware)
+    for sync_engine in sync_engines:
+        instrument_engine(sync_engine)
+
+# Prometheus text exposition
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}" if labels else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Exposition:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value, **labels):
+        self.lines.append(f"{name}{_labels(**labels)} {_number(value)}")
+
+    def histogram(self, name: str, histogram: Histogram, **labels):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            self.sample(f"{name}_bucket", cumulative, **labels, le=_number(float(bound)))
+        cumulative += histogram.counts[-1]
+        self.sample(f"{name}_bucket", cumulative, **labels, le="+Inf")
+        self.sample(f"{name}_sum", histogram.sum, **labels)
+        self.sample(f"{name}_count", cumulative, **labels)
+
+def render(ai_stats: Optional[dict] = None, cache_stats: Optional[Dict[str, dict]] = None) -> str:
+    """All metrics in Prometheus text format, including llm_client.stats() and cache snapshots when given"""
+    out = _Exposition()
+    with _lock:
+        out.family("flexifi_http_requests_total", "counter", "HTTP requests by route and status code")
+        for (method, route, status), count in sorted(_requests.items()):
+            out.sample("flexifi_http_requests_total", count, method=method, route=route, status=status)
+
+        out.family("flexifi_http_request_duration_seconds", "histogram", "Time from receiving a request to sending the last byte of its response")
+        for (method, route), histogram in sorted(_durations.items()):
+            out.histogram("flexifi_http_request_duration_seconds", histogram, method=method, route=route)
+
+        out.family("flexifi_http_response_size_bytes", "histogram", "Response body size")
+        for (method, route), histogram in sorted(_sizes.items()):
+            out.histogram("flexifi_http_response_size_bytes", histogram, method=method, route=route)
+
+        out.family("flexifi_http_request_phase_seconds", "histogram",
+                   "Time a request spent in database statements (db), Gemini calls (gemini) and response serialization (serialization)")
+        for (method, route, phase), histogram in sorted(_phases.items()):
+            out.histogram("flexifi_http_request_phase_seconds", histogram, method=method, route=route, phase=phase)
+
+        out.family("flexifi_db_statements_total", "counter", "Database statements executed by requests")
+        for (method, route), count in sorted(_db_queries.items()):
+            out.sample("flexifi_db_statements_total", count, method=method, route=route)
+
+    out.family("flexifi_http_requests_in_flight", "gauge", "Requests currently being handled")
+    for (method, route), count in sorted(_in_flight.items()):
+        out.sample("flexifi_http_requests_in_flight", count, method=method, route=route)
+
+    if ai_stats is not None:
+        out.family("flexifi_gemini_calls_in_flight", "gauge", "Gemini calls holding a concurrency slot")
+        out.sample("flexifi_gemini_calls_in_flight", ai_stats["in_flight"])
+        out.family("flexifi_gemini_calls_waiting", "gauge", "Gemini calls waiting for a concurrency slot")
+        out.sample("flexifi_gemini_calls_waiting", ai_stats["waiting"])
+        out.family("flexifi_gemini_breaker_state", "gauge", "Circuit breaker state (1 for the current state)")
+        for state in ("closed", "open", "half_open"):
+            out.sample("flexifi_gemini_breaker_state", int(ai_stats["breaker_state"] == state), state=state)
+        out.family("flexifi_gemini_breaker_transitions_total", "counter", "Circuit breaker state changes")
+        for transition, count in sorted(ai_stats["breaker_transitions"].items()):
+            out.sample("flexifi_gemini_breaker_transitions_total", count, transition=transition)
+        out.family("flexifi_gemini_rejections_total", "counter", "Gemini calls refused without being attempted")
+        for reason, count in sorted(ai_stats["rejections"].items()):
+            out.sample("flexifi_gemini_rejections_total", count, reason=reason)
+        out.family("flexifi_gemini_retries_total", "counter", "Gemini call retries after a transient error")
+        out.sample("flexifi_gemini_retries_total", ai_stats["retries"])
+        out.family("flexifi_gemini_transient_errors_total", "counter", "Gemini timeouts, 429s, 5xx and connection errors")
+        out.sample("flexifi_gemini_transient_errors_total", ai_stats["transient_errors"])
+
+    if cache_stats:
+        for stat, help_text in (("hits", "Cache lookups served from the cache"),
+                                ("misses", "Cache lookups that went to the source"),
+                                ("evictions", "Entries evicted to stay within the cache size")):
+            out.family(f"flexifi_cache_{stat}_total", "counter", help_text)
+            for cache, snapshot in sorted(cache_stats.items()):
+                out.sample(f"flexifi_cache_{stat}_total", snapshot[stat], cache=cache)
+
+    return "\n".join(out.lines) + "\n"
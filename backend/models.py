@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, Boolean, Index, text, DDL, event
 from sqlalchemy.sql import func
 from database import Base
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional, List
+from money import DEFAULT_CURRENCY, from_minor, to_minor
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, model_validator
+from typing import ClassVar, Optional, List, Tuple
 from datetime import datetime, date
 
 # SQLAlchemy Models
@@ -22,42 +23,117 @@ class Account(Base):
     account_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     account_number = Column(String, nullable=False)
-    current_balance = Column(Float, default=0.0)
+    current_balance_minor = Column(BigInteger, default=0)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        Index("ix_accounts_user_id", "user_id"),
+    )
+
 class Budget(Base):
     __tablename__ = "budgets"
 
     budget_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
-    monthly_budget = Column(Float, nullable=False)
+    monthly_budget_minor = Column(BigInteger, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        # The newest budget is the user's active one
+        Index("ix_budgets_user_created_id", "user_id", "created_at", "budget_id"),
+    )
+
 class Transaction(Base):
     __tablename__ = "transactions"
 
     transaction_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount_minor = Column(BigInteger, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
     category = Column(String, nullable=False)
     description = Column(String, nullable=False)
     date = Column(DateTime, nullable=False)
     payment_method = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True)  # Set by statement imports to drop re-imported rows
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        # Backs keyset pagination of a user's history ordered by (date, transaction_id)
+        Index("ix_transactions_user_date_id", "user_id", "date", "transaction_id"),
+        Index("ux_transactions_content_hash", "content_hash", unique=True),
+    )
+
+# Full-text index over description and category for GET /transactions/search
+# (see search.py), kept in sync by triggers. On SQLite it is a contentless FTS5
+# table whose owner column holds "u<user_id>", so a search only ranks the
+# user's own rows; on PostgreSQL a tsvector column with a GIN index.
+TRANSACTION_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5("
+        "description, category, owner, content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN "
+        "INSERT INTO transactions_fts (rowid, description, category, owner) "
+        "VALUES (new.transaction_id, new.description, new.category, 'u' || new.user_id); END",
+        # A contentless table needs the old values to remove a row from the index
+        "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN "
+        "INSERT INTO transactions_fts (transactions_fts, rowid, description, category, owner) "
+        "VALUES ('delete', old.transaction_id, old.description, old.category, 'u' || old.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, category, user_id ON transactions BEGIN "
+        "INSERT INTO transactions_fts (transactions_fts, rowid, description, category, owner) "
+        "VALUES ('delete', old.transaction_id, old.description, old.category, 'u' || old.user_id); "
+        "INSERT INTO transactions_fts (rowid, description, category, owner) "
+        "VALUES (new.transaction_id, new.description, new.category, 'u' || new.user_id); END",
+    ],
+    "postgresql": [
+        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_search_vector ON transactions USING GIN (search_vector)",
+        "DROP TRIGGER IF EXISTS transactions_search_vector_update ON transactions",
+        "CREATE TRIGGER transactions_search_vector_update BEFORE INSERT OR UPDATE OF description, category "
+        "ON transactions FOR EACH ROW EXECUTE FUNCTION "
+        "tsvector_update_trigger(search_vector, 'pg_catalog.simple', description, category)",
+    ],
+}
+
+for _dialect, _statements in TRANSACTION_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Transaction.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+# drop_all removes the triggers with the table, but the FTS5 table would be left behind
+event.listen(Transaction.__table__, "before_drop", DDL("DROP TABLE IF EXISTS transactions_fts").execute_if(dialect="sqlite"))
+
+# Per-user, per-month category totals maintained alongside every transaction write
+class CategoryRollup(Base):
+    __tablename__ = "category_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    month = Column(String, primary_key=True)  # "YYYY-MM" of the transaction date
+    category = Column(String, primary_key=True)
+    # Amounts in minor units of DEFAULT_CURRENCY
+    total_minor = Column(BigInteger, nullable=False, default=0)
+    credits_minor = Column(BigInteger, nullable=False, default=0)  # Sum of the positive amounts only
+    count = Column(Integer, nullable=False, default=0)
+    min_amount_minor = Column(BigInteger, nullable=False)
+    max_amount_minor = Column(BigInteger, nullable=False)
+
 class SavingsGoal(Base):
     __tablename__ = "savings_goals"
 
     goal_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     goal_name = Column(String, nullable=False)
-    target_amount = Column(Float, nullable=False)
-    current_amount = Column(Float, default=0.0)
+    target_amount_minor = Column(BigInteger, nullable=False)
+    current_amount_minor = Column(BigInteger, default=0)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
     deadline = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        Index("ix_savings_goals_user_id", "user_id"),
+    )
+
 class AIAnalysis(Base):
     __tablename__ = "ai_analyses"
 
@@ -66,6 +142,38 @@ class AIAnalysis(Base):
     analysis_type = Column(String, nullable=False)
     result = Column(Text, nullable=False)
     created_at = Column(DateTime, default=func.now())
+    data_fingerprint = Column(String, nullable=True)  # insights_cache.data_fingerprint of the input; None for failures
+
+    __table_args__ = (
+        Index("ix_ai_analyses_user_type_fingerprint", "user_id", "analysis_type", "data_fingerprint"),
+    )
+
+# Queued AI analysis requests, processed by the workers in ai_jobs.py
+class AIJob(Base):
+    __tablename__ = "ai_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    analysis_type = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False)  # Earliest time to (re)try the job
+    analysis_id = Column(Integer, ForeignKey("ai_analyses.analysis_id"), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_ai_jobs_status_run_after", "status", "run_after"),
+        # Finds a user's queued or running job of a type in enqueue_analysis
+        Index("ix_ai_jobs_user_type_id", "user_id", "analysis_type", "job_id"),
+        # At most one queued or running job per user and analysis type
+        Index(
+            "ux_ai_jobs_active", "user_id", "analysis_type", unique=True,
+            sqlite_where=text("status IN ('pending', 'running')"),
+            postgresql_where=text("status IN ('pending', 'running')"),
+        ),
+    )
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -74,10 +182,67 @@ class ChatMessage(Base):
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     is_user = Column(Integer, default=1)  # 1 for user message, 0 for AI response
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    # Set in Python so SQLite stores it in the same format as the bound values
+    # it is compared with in keyset pagination (see normalize_chat_timestamps)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Backs keyset pagination of a user's chat history ordered by (created_at, message_id)
+        Index("ix_chat_messages_user_created_id", "user_id", "created_at", "message_id"),
+    )
+
+# Rolling summary of a user's older chat messages, maintained by chat_context.py
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    summary = Column(Text, nullable=False)
+    through_message_id = Column(Integer, nullable=False)  # Last message folded into the summary
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 # Pydantic Models for Request/Response
 
+class MoneyFields(BaseModel):
+    """Decimal amounts in the API, integer minor units in the database (see money.py).
+
+    Each field in MONEY_FIELDS is stored in the <field>_minor column: it is read
+    from there when validating an ORM row, and to_columns() converts it back.
+    Rollups, /summary and the amount filters sum minor units without looking
+    at the currency, so input in any currency but DEFAULT_CURRENCY is rejected.
+    """
+    MONEY_FIELDS: ClassVar[Tuple[str, ...]] = ()
+
+    currency: str = Field(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$")
+
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_minor_units(cls, data):
+        if not isinstance(data, Base):
+            currency = data.get("currency") if isinstance(data, dict) else getattr(data, "currency", None)
+            if currency not in (None, DEFAULT_CURRENCY):
+                raise ValueError(f"Currency {currency} is not supported, amounts must be in {DEFAULT_CURRENCY}")
+            return data
+        currency = getattr(data, "currency", None) or DEFAULT_CURRENCY
+        values = {name: getattr(data, name) for name in cls.model_fields if hasattr(data, name)}
+        for name in cls.MONEY_FIELDS:
+            values[name] = from_minor(getattr(data, f"{name}_minor"), currency)
+        return values
+
+    @model_validator(mode="after")
+    def _check_range(self):
+        self.to_columns()  # Raises ValueError for amounts a BIGINT column cannot hold
+        return self
+
+    def to_columns(self) -> dict:
+        """Field values keyed by column, with amounts in minor units"""
+        values = self.model_dump()
+        for name in self.MONEY_FIELDS:
+            amount = values.pop(name)
+            values[f"{name}_minor"] = None if amount is None else to_minor(amount, self.currency)
+        return values
+
 # User models
 class UserBase(BaseModel):
     name: str
@@ -94,7 +259,9 @@ class UserResponse(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
 # Account models
-class AccountBase(BaseModel):
+class AccountBase(MoneyFields):
+    MONEY_FIELDS = ("current_balance",)
+
     account_number: str
     current_balance: float
 
@@ -109,7 +276,9 @@ class AccountResponse(AccountBase):
     model_config = ConfigDict(from_attributes=True)
 
 # Budget models
-class BudgetBase(BaseModel):
+class BudgetBase(MoneyFields):
+    MONEY_FIELDS = ("monthly_budget",)
+
     monthly_budget: float
     start_date: datetime
     end_date: datetime
@@ -125,7 +294,9 @@ class BudgetResponse(BudgetBase):
     model_config = ConfigDict(from_attributes=True)
 
 # Transaction models
-class TransactionBase(BaseModel):
+class TransactionBase(MoneyFields):
+    MONEY_FIELDS = ("amount",)
+
     amount: float
     category: str
     description: str
@@ -142,8 +313,31 @@ class TransactionResponse(TransactionBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Bulk transaction ingest models
+class BulkRowError(BaseModel):
+    index: int
+    errors: List[str]
+
+class BulkInsertResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
+
+class ImportReport(BaseModel):
+    rows_read: int
+    inserted: int
+    duplicates: int
+    failed: int
+    errors: List[BulkRowError]
+    elapsed_seconds: float
+    rows_per_second: float
+    # Whole server process since it started, not just this import (ru_maxrss)
+    process_peak_rss_mb: Optional[float] = None
+
 # SavingsGoal models
-class SavingsGoalBase(BaseModel):
+class SavingsGoalBase(MoneyFields):
+    MONEY_FIELDS = ("target_amount", "current_amount")
+
     goal_name: str
     target_amount: float
     current_amount: float
@@ -174,6 +368,19 @@ class AIAnalysisResponse(AIAnalysisBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class AIJobResponse(BaseModel):
+    job_id: int
+    analysis_type: str
+    status: str
+    attempts: int
+    analysis_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    analysis: Optional[AIAnalysisResponse] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 # ChatMessage models
 class ChatMessageBase(BaseModel):
     content: str
@@ -189,6 +396,30 @@ class ChatMessageResponse(ChatMessageBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Dashboard summary models
+class CategoryTotal(BaseModel):
+    name: str
+    amount: float
+
+class GoalProgress(BaseModel):
+    goal_id: int
+    goal_name: str
+    target_amount: float
+    current_amount: float
+    progress_percentage: float
+
+class DashboardSummary(BaseModel):
+    income: float
+    expenses: float
+    transaction_count: int
+    account_balance: float
+    account_count: int
+    budget: Optional[float] = None
+    savings: float
+    savings_goal: float
+    expense_categories: List[CategoryTotal]
+    goals: List[GoalProgress]
+
 # Token models for JWT authentication
 class Token(BaseModel):
     access_token: str
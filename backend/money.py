@@ -0,0 +1,38 @@
+"""
+Money amounts are stored as integers in the currency's minor unit (paise for
+INR, cents for USD) next to an ISO 4217 currency code, so sums in SQL are exact
+integer arithmetic. The API keeps sending and receiving decimal amounts; the
+conversion happens in the Pydantic models (models.MoneyFields).
+"""
+
+import os
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Optional, Union
+
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "INR")
+
+# Digits after the decimal point; currencies not listed use 2
+MINOR_UNIT_DIGITS = {"BHD": 3, "JPY": 0, "KRW": 0, "KWD": 3, "OMR": 3, "VND": 0}
+
+# Largest magnitude a BIGINT column holds
+MAX_MINOR_UNITS = 2 ** 63 - 1
+
+def minor_digits(currency: str = DEFAULT_CURRENCY) -> int:
+    return MINOR_UNIT_DIGITS.get(currency, 2)
+
+def to_minor(amount: Union[float, int, str, Decimal], currency: str = DEFAULT_CURRENCY) -> int:
+    """Decimal amount -> integer minor units, rounding half away from zero (120.555 INR -> 12056)"""
+    try:
+        minor = Decimal(str(amount)).scaleb(minor_digits(currency))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {amount!r}")
+    if not minor.is_finite() or abs(minor) > MAX_MINOR_UNITS:
+        raise ValueError(f"Amount {amount!r} is out of range")
+    return int(minor.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_minor(minor: Optional[int], currency: str = DEFAULT_CURRENCY) -> Optional[float]:
+    """Integer minor units -> decimal amount as a float (12056 INR -> 120.56); None stays None"""
+    if minor is None:
+        return None
+    # int / int is correctly rounded, so this is the float closest to the exact decimal
+    return int(minor) / 10 ** minor_digits(currency)
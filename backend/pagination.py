@@ -0,0 +1,32 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+# Header used to hand the next page's cursor back to the client
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Encode the (datetime, id) keyset position of the last row on a page"""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Decode a cursor produced by encode_cursor, raising a 400 if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_after(sort_column, id_column, position: Tuple[datetime, int], descending: bool = True):
+    """Build the WHERE clause selecting rows that come after `position` in (sort, id) order"""
+    sort_value, row_id = position
+    if descending:
+        return (sort_column < sort_value) | ((sort_column == sort_value) & (id_column < row_id))
+    return (sort_column > sort_value) | ((sort_column == sort_value) & (id_column > row_id))
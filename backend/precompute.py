@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pre-generate AI analyses off-peak so the AI Analysis page is served from stored results.
+
+For every active user with transactions who already has an analysis of one of
+PRECOMPUTE_ANALYSIS_TYPES, the current data fingerprint is compared with the
+stored ones; only analyses whose transactions, budgets or goals changed since,
+or that are older than AI_CACHE_TTL_SECONDS, are regenerated. Users who never asked for an analysis type are left alone.
+Generation runs at most --concurrency at a time and starts at most --rate
+analyses per minute, to stay clear of Gemini quota. Afterwards POST
+/ai-analysis/ finds the stored analysis by fingerprint and answers in
+milliseconds.
+
+Usage:
+    python precompute.py                           # one pass now, e.g. from cron
+    python precompute.py --window 01:00-05:00      # keep running, one pass per night in the window
+    python precompute.py --every 3600              # keep running, one pass per hour
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import exists, select
+
+from analysis import AnalysisFailed, find_current_analysis, run_analysis
+from database import AsyncSessionLocal, async_engine
+from insights_cache import data_fingerprint
+from llm_client import LLMRejectedError
+from models import AIAnalysis, Transaction, User
+
+PRECOMPUTE_ANALYSIS_TYPES = [t.strip() for t in os.getenv("PRECOMPUTE_ANALYSIS_TYPES", "general,budget,savings").split(",") if t.strip()]
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))
+PRECOMPUTE_RATE_PER_MINUTE = float(os.getenv("PRECOMPUTE_RATE_PER_MINUTE", "30"))
+
+async def stale_analyses(analysis_types: List[str]) -> List[Tuple[int, str]]:
+    """(user_id, analysis_type) pairs analysed before, but not recently for the user's current data"""
+    async with AsyncSessionLocal() as db:
+        analysed = (await db.execute(
+            select(AIAnalysis.user_id, AIAnalysis.analysis_type).distinct()
+            .join(User, User.user_id == AIAnalysis.user_id)
+            .where(
+                User.is_active == True,
+                AIAnalysis.analysis_type.in_(analysis_types),
+                # Failures store no fingerprint and don't count as an analysis
+                AIAnalysis.data_fingerprint.is_not(None),
+                exists().where(Transaction.user_id == AIAnalysis.user_id),
+            )
+            .order_by(AIAnalysis.user_id, AIAnalysis.analysis_type)
+        )).all()
+        stale = []
+        fingerprints = {}
+        for user_id, analysis_type in analysed:
+            if user_id not in fingerprints:
+                fingerprints[user_id] = await data_fingerprint(db, user_id)
+            if await find_current_analysis(db, user_id, analysis_type, fingerprints[user_id]) is None:
+                stale.append((user_id, analysis_type))
+        return stale
+
+async def precompute(analysis_types: List[str], concurrency: int, rate_per_minute: float) -> dict:
+    """Generate every stale analysis once; returns counts of generated and failed"""
+    started = time.perf_counter()
+    pending = await stale_analyses(analysis_types)
+    print(f"🧮 {len(pending)} analyses to precompute")
+
+    slots = asyncio.Semaphore(concurrency)
+    interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+    counts = {"generated": 0, "failed": 0}
+
+    async def generate(user_id: int, analysis_type: str):
+        try:
+            async with AsyncSessionLocal() as db:
+                await run_analysis(db, user_id, analysis_type, save_failures=False, serve_stale=False)
+            counts["generated"] += 1
+        except Exception as e:
+            # Left for the next pass; AnalysisFailed is usually quota or a timeout
+            kind = "Gemini" if isinstance(e, (AnalysisFailed, LLMRejectedError)) else type(e).__name__
+            print(f"❌ user {user_id} {analysis_type}: {kind}: {e}")
+            counts["failed"] += 1
+        finally:
+            slots.release()
+
+    tasks = []
+    for i, (user_id, analysis_type) in enumerate(pending):
+        await slots.acquire()
+        tasks.append(asyncio.create_task(generate(user_id, analysis_type)))
+        if interval and i < len(pending) - 1:
+            await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    print(f"✅ Generated {counts['generated']}, failed {counts['failed']} in {counts['seconds']}s")
+    return counts
+
+def parse_window(window: str) -> Tuple[int, int]:
+    """'01:00-05:00' -> minutes after midnight of the start and end"""
+    start, end = window.split("-")
+    to_minutes = lambda value: int(value.split(":")[0]) * 60 + int(value.split(":")[1])
+    return to_minutes(start), to_minutes(end)
+
+def seconds_until_window(window: Tuple[int, int], now: Optional[datetime] = None) -> float:
+    """0 inside the window, otherwise seconds until it next opens (local time)"""
+    now = now or datetime.now()
+    start, end = window
+    minute = now.hour * 60 + now.minute
+    inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+    if inside:
+        return 0.0
+    opens = now.replace(hour=start // 60, minute=start % 60, second=0, microsecond=0)
+    if opens <= now:
+        opens += timedelta(days=1)
+    return (opens - now).total_seconds()
+
+async def run_scheduler(args):
+    window = parse_window(args.window) if args.window else None
+    while True:
+        if window:
+            wait = seconds_until_window(window)
+            if wait:
+                print(f"💤 Next window opens in {wait / 3600:.1f}h")
+                await asyncio.sleep(wait)
+        await precompute(args.types, args.concurrency, args.rate)
+        if window:
+            # One pass per window: sleep past its end
+            await asyncio.sleep(max(seconds_until_window((window[1], window[0])), 60))
+        else:
+            await asyncio.sleep(args.every)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate AI analyses for users whose data changed")
+    parser.add_argument("--types", type=lambda value: value.split(","), default=PRECOMPUTE_ANALYSIS_TYPES)
+    parser.add_argument("--concurrency", type=int, default=PRECOMPUTE_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=PRECOMPUTE_RATE_PER_MINUTE, help="Max analyses started per minute")
+    parser.add_argument("--window", help="Off-peak window in local time, e.g. 01:00-05:00; runs one pass per night")
+    parser.add_argument("--every", type=float, help="Seconds between passes for rolling precomputation")
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            if args.window or args.every:
+                await run_scheduler(args)
+            else:
+                await precompute(args.types, args.concurrency, args.rate)
+        finally:
+            # Pooled aiosqlite connections keep the process alive otherwise
+            await async_engine.dispose()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Compact, size-bounded transaction context for AI prompts.
+
+Instead of every transaction as JSON, the prompt gets pipe-separated tables:
+per-category and per-month totals from the rollup table, the most recent
+transactions and the largest recent expenses. Sections are added in that
+order, row by row, until PROMPT_TOKEN_BUDGET (estimated) is reached, so the
+prompt stays the same size however long the user's history is.
+
+Run this file directly to print the context for a user:
+    python prompt_context.py --user-id 1 [--budget 3000]
+"""
+
+import argparse
+import math
+import os
+from datetime import timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import CategoryRollup, Transaction
+from money import from_minor
+
+# Estimated tokens available for the transaction context (excludes the instructions)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_MONTHS = int(os.getenv("PROMPT_MONTHS", "12"))
+PROMPT_RECENT_TRANSACTIONS = int(os.getenv("PROMPT_RECENT_TRANSACTIONS", "50"))
+PROMPT_TOP_EXPENSES = int(os.getenv("PROMPT_TOP_EXPENSES", "10"))
+# Largest expenses are taken from this many days before the latest transaction
+PROMPT_TOP_EXPENSE_DAYS = int(os.getenv("PROMPT_TOP_EXPENSE_DAYS", "90"))
+
+DESCRIPTION_CHARS = 40
+
+def estimate_tokens(text: str) -> int:
+    """Fast token estimate of 4 UTF-8 bytes per token, on the high side for English text"""
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+def _cell(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+def _row(*values) -> str:
+    return "|".join(_cell(value) for value in values)
+
+def _describe(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= DESCRIPTION_CHARS else text[:DESCRIPTION_CHARS - 1] + "…"
+
+def _category_section(db: Session, user_id: int):
+    spent = func.sum(CategoryRollup.total_minor - CategoryRollup.credits_minor)
+    rows = db.query(
+        CategoryRollup.category, spent, func.sum(CategoryRollup.credits_minor), func.sum(CategoryRollup.count)
+    ).filter(CategoryRollup.user_id == user_id).group_by(CategoryRollup.category).order_by(spent).all()
+    return "CATEGORIES (category|spent|income|count)", [
+        _row(category, from_minor(spent), from_minor(income), count) for category, spent, income, count in rows
+    ]
+
+def _month_section(db: Session, user_id: int):
+    rows = db.query(
+        CategoryRollup.month,
+        func.sum(CategoryRollup.credits_minor),
+        func.sum(CategoryRollup.total_minor - CategoryRollup.credits_minor),
+        func.sum(CategoryRollup.count),
+    ).filter(CategoryRollup.user_id == user_id).group_by(CategoryRollup.month) \
+        .order_by(CategoryRollup.month.desc()).limit(PROMPT_MONTHS).all()
+    return "MONTHS newest first (month|income|spent|count)", [
+        _row(month, from_minor(income), from_minor(spent), count) for month, income, spent, count in rows
+    ]
+
+def _transaction_rows(rows) -> List[str]:
+    return [
+        _row(date.strftime("%Y-%m-%d"), from_minor(amount, currency), category, payment_method, _describe(description))
+        for date, amount, currency, category, description, payment_method in rows
+    ]
+
+def _transaction_sections(db: Session, user_id: int):
+    columns = (Transaction.date, Transaction.amount_minor, Transaction.currency, Transaction.category,
+               Transaction.description, Transaction.payment_method)
+    recent = db.query(*columns).filter(Transaction.user_id == user_id) \
+        .order_by(Transaction.date.desc(), Transaction.transaction_id.desc()).limit(PROMPT_RECENT_TRANSACTIONS).all()
+    sections = [("RECENT TRANSACTIONS newest first (date|amount|category|payment|description)", _transaction_rows(recent))]
+
+    if recent and PROMPT_TOP_EXPENSES > 0:
+        since = recent[0][0] - timedelta(days=PROMPT_TOP_EXPENSE_DAYS)
+        largest = db.query(*columns).filter(
+            Transaction.user_id == user_id, Transaction.date >= since, Transaction.amount_minor < 0
+        ).order_by(Transaction.amount_minor).limit(PROMPT_TOP_EXPENSES).all()
+        sections.append((
+            f"LARGEST EXPENSES last {PROMPT_TOP_EXPENSE_DAYS} days (date|amount|category|payment|description)",
+            _transaction_rows(largest),
+        ))
+    return sections
+
+def render_sections(sections, token_budget: int) -> dict:
+    """Join sections row by row until the token budget is used up"""
+    lines = []
+    used = 0
+    omitted = 0
+    for header, rows in sections:
+        if not rows:
+            continue
+        cost = estimate_tokens(header) + 1
+        if used + cost > token_budget:
+            omitted += len(rows)
+            continue
+        lines.append(header)
+        used += cost
+        for i, row in enumerate(rows):
+            cost = estimate_tokens(row) + 1
+            if used + cost > token_budget:
+                omitted += len(rows) - i
+                break
+            lines.append(row)
+            used += cost
+    if omitted:
+        lines.append(f"({omitted} rows omitted for length)")
+    if not lines:
+        lines.append("No transactions recorded yet.")
+    return {"text": "\n".join(lines), "tokens": used, "omitted_rows": omitted}
+
+def build_prompt_context(db: Session, user_id: int, token_budget: Optional[int] = None) -> dict:
+    """Return {"text", "tokens", "omitted_rows"} describing a user's transactions for a prompt"""
+    sections = [_category_section(db, user_id), _month_section(db, user_id)]
+    sections += _transaction_sections(db, user_id)
+    return render_sections(sections, PROMPT_TOKEN_BUDGET if token_budget is None else token_budget)
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Print the AI prompt context for a user")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--budget", type=int, default=None, help="Token budget (default PROMPT_TOKEN_BUDGET)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        context = build_prompt_context(db, args.user_id, args.budget)
+    finally:
+        db.close()
+    print(context["text"])
+    print(f"\n📏 ~{context['tokens']} tokens, {len(context['text'].encode())} bytes, {context['omitted_rows']} rows omitted")
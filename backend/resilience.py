@@ -0,0 +1,111 @@
+"""
+Building blocks for calling a rate-limited, occasionally failing service.
+
+- TokenBucket: admits calls at a steady rate with a limited burst, so we stay
+  inside a requests-per-minute quota instead of running into 429s.
+- CircuitBreaker: after repeated failures, rejects calls straight away for a
+  cool-down period, then lets a single trial call through to probe recovery.
+- backoff_delay: "full jitter" exponential backoff between retries, which keeps
+  clients that failed together from retrying in lockstep.
+
+Both classes are meant to be used from one event loop and are not thread-safe.
+"""
+
+import random
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+class TokenBucket:
+    """Holds up to burst tokens, refilled at rate_per_minute; one token per call"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token, returning how long to wait before using it.
+
+        Returns None, taking nothing, if the wait would exceed max_wait.
+        Tokens may go negative: later callers then queue behind earlier ones.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold consecutive failures;
+    open -> half_open after reset_seconds; half_open -> closed on a successful
+    trial call, back to open on a failed one."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, on_transition: Optional[Callable[[str, str], None]] = None):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.on_transition = on_transition
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.transitions = Counter()
+
+    def _move(self, state: str):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        self.transitions[f"{previous}->{state}"] += 1
+        if self.on_transition:
+            self.on_transition(previous, state)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; in half-open state only one at a time does"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self._move(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.trial_in_flight = False
+        self._move(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._move(self.OPEN)
+
+    def release(self):
+        """Give up a call let through by allow() without recording an outcome"""
+        self.trial_in_flight = False
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a trial call through"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Random delay in [0, min(cap, base * 2**attempt)) before retry number attempt (from 0)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
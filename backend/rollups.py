@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Per-user, per-month category rollups.
+
+Writers call record_transactions() in the same session (and so the same DB
+transaction) as the Transaction insert. Readers use get_spending_totals() to
+get totals in O(categories) instead of scanning the user's full history.
+
+Run this file directly to rebuild the table from the transactions table:
+    python rollups.py [--user-id N]
+"""
+
+import argparse
+from collections import defaultdict
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from models import CategoryRollup, Transaction
+from money import from_minor
+
+def month_key(value) -> str:
+    """Rollup bucket for a transaction date"""
+    return value.strftime("%Y-%m")
+
+def dialect_insert(db: Session):
+    """INSERT construct supporting ON CONFLICT for the session's database"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def _month_expr(db: Session, column):
+    """SQL expression rendering a DateTime column as "YYYY-MM" """
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+def record_transactions(db: Session, transactions: Iterable[Mapping]):
+    """Fold transactions (mappings with user_id, date, category, amount_minor) into the rollups.
+
+    Rows are pre-aggregated per bucket so a batch costs one upsert per
+    (user, month, category) touched. Nothing is committed here; the caller's
+    commit makes the rollup update atomic with the transaction insert.
+    """
+    buckets = defaultdict(lambda: {"total_minor": 0, "credits_minor": 0, "count": 0, "min_amount_minor": None, "max_amount_minor": None})
+    for tx in transactions:
+        amount = int(tx["amount_minor"])
+        bucket = buckets[(tx["user_id"], month_key(tx["date"]), tx["category"])]
+        bucket["total_minor"] += amount
+        bucket["credits_minor"] += amount if amount > 0 else 0
+        bucket["count"] += 1
+        bucket["min_amount_minor"] = amount if bucket["min_amount_minor"] is None else min(bucket["min_amount_minor"], amount)
+        bucket["max_amount_minor"] = amount if bucket["max_amount_minor"] is None else max(bucket["max_amount_minor"], amount)
+    if not buckets:
+        return
+
+    insert = dialect_insert(db)
+    stmt = insert(CategoryRollup)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CategoryRollup.user_id, CategoryRollup.month, CategoryRollup.category],
+        set_={
+            "total_minor": CategoryRollup.total_minor + excluded.total_minor,
+            "credits_minor": CategoryRollup.credits_minor + excluded.credits_minor,
+            "count": CategoryRollup.count + excluded.count,
+            "min_amount_minor": case((excluded.min_amount_minor < CategoryRollup.min_amount_minor, excluded.min_amount_minor),
+                                     else_=CategoryRollup.min_amount_minor),
+            "max_amount_minor": case((excluded.max_amount_minor > CategoryRollup.max_amount_minor, excluded.max_amount_minor),
+                                     else_=CategoryRollup.max_amount_minor),
+        },
+    )
+    db.execute(stmt, [
+        {"user_id": user_id, "month": month, "category": category, **values}
+        for (user_id, month, category), values in buckets.items()
+    ])
+
+def record_transaction(db: Session, transaction: Transaction):
+    """Fold a single Transaction ORM object into the rollups"""
+    record_transactions(db, [{
+        "user_id": transaction.user_id,
+        "date": transaction.date,
+        "category": transaction.category,
+        "amount_minor": transaction.amount_minor,
+    }])
+
+def get_spending_totals(db: Session, user_id: int) -> dict:
+    """Return total_spent (negative), total_income and net amount per category for a user.
+
+    Sums are exact in minor units; the amounts returned are decimal.
+    """
+    rows = db.query(
+        CategoryRollup.category,
+        func.sum(CategoryRollup.total_minor),
+        func.sum(CategoryRollup.credits_minor)
+    ).filter(CategoryRollup.user_id == user_id).group_by(CategoryRollup.category).all()
+
+    categories = {}
+    total_spent = 0
+    total_income = 0
+    for category, total, credits in rows:
+        categories[category] = from_minor(total)
+        total_income += credits
+        total_spent += total - credits
+    return {"total_spent": from_minor(total_spent), "total_income": from_minor(total_income), "categories": categories}
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute rollups from the transactions table, for one user or everyone.
+
+    Returns the number of rollup rows written. The caller commits.
+    """
+    delete_query = db.query(CategoryRollup)
+    if user_id is not None:
+        delete_query = delete_query.filter(CategoryRollup.user_id == user_id)
+    delete_query.delete(synchronize_session=False)
+
+    month = _month_expr(db, Transaction.date)
+    source = db.query(
+        Transaction.user_id,
+        month,
+        Transaction.category,
+        func.sum(Transaction.amount_minor),
+        func.sum(case((Transaction.amount_minor > 0, Transaction.amount_minor), else_=0)),
+        func.count(Transaction.transaction_id),
+        func.min(Transaction.amount_minor),
+        func.max(Transaction.amount_minor)
+    )
+    if user_id is not None:
+        source = source.filter(Transaction.user_id == user_id)
+    source = source.group_by(Transaction.user_id, month, Transaction.category)
+
+    insert = dialect_insert(db)
+    result = db.execute(insert(CategoryRollup).from_select(
+        ["user_id", "month", "category", "total_minor", "credits_minor", "count", "min_amount_minor", "max_amount_minor"],
+        source.subquery().select()
+    ))
+    return result.rowcount
+
+def ensure_rollups(db: Session):
+    """Backfill the rollup table once if it is empty but transactions already exist"""
+    if db.query(CategoryRollup.user_id).first() is None and db.query(Transaction.transaction_id).first() is not None:
+        rows = rebuild_rollups(db)
+        db.commit()
+        print(f"✅ Backfilled {rows} category rollup rows")
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    from models import Base
+
+    parser = argparse.ArgumentParser(description="Rebuild the per-month category rollup table")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild rollups for this user")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rows = rebuild_rollups(db, args.user_id)
+        db.commit()
+        print(f"✅ Rebuilt {rows} category rollup rows")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error rebuilding rollups: {e}")
+    finally:
+        db.close()
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models
+from money import to_minor
 from datetime import datetime, timedelta
 import random
 
@@ -37,13 +38,13 @@ def create_sample_data():
         budgets = [
             models.Budget(
                 user_id=users[0].user_id,
-                monthly_budget=50000.0,
+                monthly_budget_minor=to_minor(50000.0),
                 start_date=month_start,
                 end_date=next_month_start - timedelta(days=1)
             ),
             models.Budget(
                 user_id=users[1].user_id,
-                monthly_budget=75000.0,
+                monthly_budget_minor=to_minor(75000.0),
                 start_date=month_start,
                 end_date=next_month_start - timedelta(days=1)
             ),
@@ -65,7 +66,7 @@ def create_sample_data():
                 transactions.append(
                     models.Transaction(
                         user_id=users[0].user_id,
-                        amount=60000.0,
+                        amount_minor=to_minor(60000.0),
                         category="Income",
                         description="Salary",
                         date=date,
@@ -87,7 +88,7 @@ def create_sample_data():
                     transactions.append(
                         models.Transaction(
                             user_id=users[0].user_id,
-                            amount=amount,
+                            amount_minor=to_minor(amount),
                             category=category,
                             description=f"{category} expense",
                             date=date,
@@ -103,7 +104,7 @@ def create_sample_data():
                 transactions.append(
                     models.Transaction(
                         user_id=users[1].user_id,
-                        amount=80000.0,
+                        amount_minor=to_minor(80000.0),
                         category="Income",
                         description="Salary",
                         date=date,
@@ -125,7 +126,7 @@ def create_sample_data():
                     transactions.append(
                         models.Transaction(
                             user_id=users[1].user_id,
-                            amount=amount,
+                            amount_minor=to_minor(amount),
                             category=category,
                             description=f"{category} expense",
                             date=date,
@@ -141,22 +142,22 @@ def create_sample_data():
             models.SavingsGoal(
                 user_id=users[0].user_id,
                 goal_name="Vacation",
-                target_amount=100000.0,
-                current_amount=75000.0,
+                target_amount_minor=to_minor(100000.0),
+                current_amount_minor=to_minor(75000.0),
                 deadline=datetime.now() + timedelta(days=90)
             ),
             models.SavingsGoal(
                 user_id=users[0].user_id,
                 goal_name="New Laptop",
-                target_amount=80000.0,
-                current_amount=20000.0,
+                target_amount_minor=to_minor(80000.0),
+                current_amount_minor=to_minor(20000.0),
                 deadline=datetime.now() + timedelta(days=60)
             ),
             models.SavingsGoal(
                 user_id=users[1].user_id,
                 goal_name="Car Down Payment",
-                target_amount=200000.0,
-                current_amount=150000.0,
+                target_amount_minor=to_minor(200000.0),
+                current_amount_minor=to_minor(150000.0),
                 deadline=datetime.now() + timedelta(days=180)
             ),
         ]
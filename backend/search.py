@@ -0,0 +1,93 @@
+"""
+Full-text search over transaction descriptions and categories.
+
+Every word of the query must match the start of a word in the description or
+category ("swig lun" finds "Swiggy lunch"); single letters must match whole
+words. Results are ranked by relevance, description matches first, then
+newest first, and can be combined with the usual transaction filters.
+
+The index itself is defined with the Transaction model (TRANSACTION_SEARCH_DDL):
+FTS5 on SQLite and a tsvector column on PostgreSQL, both maintained by
+triggers. Other databases fall back to LIKE, without ranking.
+"""
+
+import re
+from typing import List
+
+from sqlalchemy import and_, column, func, inspect, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+
+from models import TRANSACTION_SEARCH_DDL, Transaction
+
+SEARCH_MAX_TERMS = 8
+
+# Index rows that existed before the search index was added
+_BACKFILL = {
+    "sqlite": "INSERT INTO transactions_fts (rowid, description, category, owner) "
+              "SELECT transaction_id, description, category, 'u' || user_id FROM transactions",
+    "postgresql": "UPDATE transactions SET search_vector = to_tsvector('pg_catalog.simple', "
+                  "coalesce(description, '') || ' ' || coalesce(category, '')) WHERE search_vector IS NULL",
+}
+
+def ensure_search_index(bind: Engine):
+    """Add the search index and its triggers to a database created before they existed"""
+    dialect = bind.dialect.name
+    if dialect not in TRANSACTION_SEARCH_DDL:
+        return
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table("transactions"):
+            return
+        if dialect == "sqlite":
+            exists = inspector.has_table("transactions_fts")
+        else:
+            exists = "search_vector" in {c["name"] for c in inspector.get_columns("transactions")}
+        if exists:
+            return
+        for statement in TRANSACTION_SEARCH_DDL[dialect]:
+            conn.exec_driver_sql(statement)
+        indexed = conn.exec_driver_sql(_BACKFILL[dialect]).rowcount
+    print(f"✅ Built transaction search index ({indexed} rows)")
+
+def search_terms(query: str) -> List[str]:
+    """Lower-cased words of the query; punctuation and operators are dropped"""
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+def _fts5_match(user_id: int, terms: List[str]) -> str:
+    words = [f'"{term}"*' if len(term) > 1 else f'"{term}"' for term in terms]
+    return f'owner : "u{user_id}" AND ' + " AND ".join(words)
+
+def _tsquery(terms: List[str]) -> str:
+    return " & ".join(f"{term}:*" if len(term) > 1 else term for term in terms)
+
+def search_query(dialect: str, user_id: int, terms: List[str], conditions: list, limit: int):
+    """SELECT of the user's best matching transactions for terms (from search_terms)"""
+    newest = (Transaction.date.desc(), Transaction.transaction_id.desc())
+
+    if dialect == "sqlite":
+        fts = table("transactions_fts", column("rowid"))
+        return (
+            select(Transaction)
+            .join(fts, fts.c.rowid == Transaction.transaction_id)
+            .where(text("transactions_fts MATCH :match").bindparams(match=_fts5_match(user_id, terms)))
+            .where(Transaction.user_id == user_id, *conditions)
+            # bm25 is lower for better matches; weights are description, category, owner
+            .order_by(text("bm25(transactions_fts, 2.0, 1.0, 0.0)"), *newest)
+            .limit(limit)
+        )
+
+    if dialect == "postgresql":
+        vector = literal_column("transactions.search_vector")
+        query = func.to_tsquery("pg_catalog.simple", _tsquery(terms))
+        return (
+            select(Transaction)
+            .where(Transaction.user_id == user_id, vector.op("@@")(query), *conditions)
+            .order_by(func.ts_rank(vector, query).desc(), *newest)
+            .limit(limit)
+        )
+
+    matches = [
+        or_(Transaction.description.ilike(f"%{term}%"), Transaction.category.ilike(f"%{term}%"))
+        for term in terms
+    ]
+    return select(Transaction).where(Transaction.user_id == user_id, and_(*matches), *conditions).order_by(*newest).limit(limit)
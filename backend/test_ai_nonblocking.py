@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+AI concurrency test - checks that slow Gemini calls do not hold up the API.
+
+Serves the app with uvicorn on a background thread, against a scratch SQLite
+database and the local Gemini stub (gemini_stub.py) with a one-second delay,
+then verifies that:
+  - cheap endpoints stay fast while AI requests are in flight
+  - requests beyond GEMINI_MAX_CONCURRENCY + GEMINI_MAX_WAITING get a 503
+  - a call slower than GEMINI_TIMEOUT_SECONDS returns the timeout message
+  - /chat/stream sends the first token well before the answer is complete,
+    and saves the assembled answer
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from gemini_stub import STUB_RESPONSE, start_stub
+from isolated import run_isolated
+
+STUB_DELAY = 1.0
+
+def start_server(app):
+    """Run the app on a free port in a background thread and return the server"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+async def login(client):
+    credentials = {"name": "AI Test", "email": "ai-test@example.com", "password": "testpass123"}
+    await client.post("/users/", json=credentials)
+    response = await client.post("/token", data={"username": credentials["email"], "password": credentials["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def check_event_loop_stays_free(client, headers):
+    print("\n1. Light requests while AI calls are in flight...")
+    # 2 running + 2 waiting are accepted, the last 2 are rejected
+    analyses = [
+        asyncio.create_task(client.post(f"/ai-analysis/?analysis_type=type-{i}", headers=headers))
+        for i in range(6)
+    ]
+    await asyncio.sleep(0.1)
+
+    latencies = []
+    while not all(task.done() for task in analyses):
+        started = time.perf_counter()
+        assert (await client.get("/")).status_code == 200
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+
+    responses = await asyncio.gather(*analyses)
+    codes = sorted(response.status_code for response in responses)
+    print(f"   AI status codes: {codes}")
+    print(f"   {len(latencies)} light requests, slowest {max(latencies) * 1000:.1f}ms")
+    assert codes == [200, 200, 200, 200, 503, 503], codes
+    assert all(r.json()["result"] == STUB_RESPONSE for r in responses if r.status_code == 200)
+    assert max(latencies) < STUB_DELAY / 4, "Event loop was blocked by an AI call"
+    print("   ✅ Event loop stayed responsive and overflow was rejected")
+
+async def check_timeout(client, headers, stub):
+    print("\n2. AI call slower than the timeout...")
+    stub.RequestHandlerClass.delay = 5.0
+    started = time.perf_counter()
+    response = await client.post("/ai-analysis/?analysis_type=slow", headers=headers)
+    elapsed = time.perf_counter() - started
+    stub.RequestHandlerClass.delay = STUB_DELAY
+    print(f"   {response.status_code} after {elapsed:.1f}s: {response.json()['result']}")
+    assert "took too long" in response.json()["result"]
+    assert elapsed < 4.5
+    print("   ✅ Timed out as configured")
+
+async def check_chat_stream(client, headers, stub):
+    print("\n3. Streaming chat...")
+    stub.RequestHandlerClass.chunk_delay = 0.1
+    started = time.perf_counter()
+    first_token = None
+    tokens, done = [], None
+    async with client.stream("POST", "/chat/stream", json={"content": "How much can I spend today?"}, headers=headers) as response:
+        assert response.status_code == 200, response.status_code
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "token":
+                    first_token = first_token or time.perf_counter() - started
+                    tokens.append(data["text"])
+                elif event == "done":
+                    done = data
+    total = time.perf_counter() - started
+    print(f"   {len(tokens)} tokens, first after {first_token:.2f}s, complete after {total:.2f}s")
+    assert "".join(tokens) == STUB_RESPONSE
+    assert done is not None and done["content"] == STUB_RESPONSE and done["is_user"] == 0
+    assert first_token < total / 2, "First token arrived too late"
+
+    history = (await client.get("/chat/", headers=headers)).json()
+    assert [m["content"] for m in history[-2:]] == ["How much can I spend today?", STUB_RESPONSE]
+    print("   ✅ Tokens streamed and the full answer was saved")
+
+    # Hang up after the first token; the unanswered question is dropped
+    async with client.stream("POST", "/chat/stream", json={"content": "And this week?"}, headers=headers) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event: token"):
+                break
+    await asyncio.sleep(0.5)
+    assert (await client.get("/chat/", headers=headers)).json() == history
+    print("   ✅ Question deleted when the client disconnected mid-stream")
+
+async def run_checks(app, stub):
+    server, base_url = start_server(app)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            headers = await login(client)
+            await check_event_loop_stays_free(client, headers)
+            await check_timeout(client, headers, stub)
+            await check_chat_stream(client, headers, stub)
+    finally:
+        server.should_exit = True
+        stub.shutdown()
+
+def main():
+    print("🤖 Testing non-blocking Gemini calls against the local stub")
+    print("=" * 50)
+    stub = start_stub(delay=STUB_DELAY)
+    # Read when main is imported, so set before the import below
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ai_test.db')}",
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{stub.server_port}",
+        "GEMINI_MAX_CONCURRENCY": "2",
+        "GEMINI_MAX_WAITING": "2",
+        "GEMINI_TIMEOUT_SECONDS": "3",
+        "GEMINI_RATE_PER_MINUTE": "0",
+        "GEMINI_MAX_RETRIES": "0",
+    })
+    from main import app
+
+    try:
+        asyncio.run(run_checks(app, stub))
+        print("\n🎉 AI calls no longer block the API!")
+    except AssertionError as e:
+        print(f"\n❌ AI concurrency test failed: {e}")
+        sys.exit(1)
+
+def test_ai_nonblocking():
+    run_isolated(__file__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+AI resilience test - retries, circuit breaker and rate limiter for Gemini calls.
+
+Serves the app with uvicorn on a background thread, against a scratch SQLite
+database and the local Gemini stub (gemini_stub.py) made to return errors,
+then verifies that:
+  - transient errors (503, 429) are retried and the call still succeeds
+  - repeated failures open the circuit breaker, after which AI endpoints fail
+    fast with 503 and Retry-After, or serve the last stored analysis
+  - a trial call after GEMINI_BREAKER_RESET_SECONDS closes the breaker again
+  - the rate limiter rejects calls beyond its burst
+  - /ai-stats reports the transitions and rejections
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from gemini_stub import STUB_RESPONSE, start_stub
+from isolated import run_isolated
+from resilience import TokenBucket
+
+BREAKER_FAILURES = 3
+BREAKER_RESET_SECONDS = 1.0
+
+def start_server(app):
+    """Run the app on a free port in a background thread and return the server"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+async def login(client):
+    credentials = {"name": "Resilience Test", "email": "resilience-test@example.com", "password": "testpass123"}
+    await client.post("/users/", json=credentials)
+    response = await client.post("/token", data={"username": credentials["email"], "password": credentials["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def add_transaction(client, headers, amount):
+    response = await client.post("/transactions/", headers=headers, json={
+        "amount": amount, "category": "Food", "description": "Lunch",
+        "date": "2024-05-01T12:00:00", "payment_method": "UPI",
+    })
+    assert response.status_code == 200, response.text
+
+async def check_retries(client, headers, failures):
+    print("\n1. Transient errors are retried...")
+    await add_transaction(client, headers, -250.0)
+    failures[:] = [503, 429]
+    response = await client.post("/ai-analysis/?analysis_type=general", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["result"] == STUB_RESPONSE
+    stats = (await client.get("/ai-stats")).json()
+    print(f"   retries: {stats['retries']}, breaker: {stats['breaker_state']}")
+    assert stats["retries"] == 2 and stats["breaker_state"] == "closed"
+    print("   ✅ Analysis succeeded after two retries")
+    return response.json()["analysis_id"]
+
+async def check_breaker_opens(client, headers, failures, stored_id):
+    print("\n2. Repeated failures open the breaker...")
+    await add_transaction(client, headers, -90.0)  # The stored analysis is now out of date
+    failures[:] = [500] * BREAKER_FAILURES
+    response = await client.post("/ai-analysis/?analysis_type=general", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["analysis_id"] == stored_id, "Expected the last stored analysis"
+    stats = (await client.get("/ai-stats")).json()
+    assert stats["breaker_state"] == "open", stats
+    print(f"   ✅ Served stored analysis {stored_id} when the calls failed")
+
+    started = time.perf_counter()
+    response = await client.post("/ai-analysis/?analysis_type=general", headers=headers)
+    elapsed = time.perf_counter() - started
+    assert response.json()["analysis_id"] == stored_id
+    response = await client.post("/chat/", headers=headers, json={"content": "How much can I spend today?"})
+    print(f"   chat: {response.status_code}, Retry-After {response.headers.get('retry-after')}")
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+    history = (await client.get("/chat/", headers=headers)).json()
+    assert not history, "A refused chat message should not be saved"
+    assert not failures, "No call should reach Gemini while the breaker is open"
+    print(f"   ✅ Failed fast while open (analysis in {elapsed * 1000:.0f}ms)")
+
+async def check_breaker_closes(client, headers, stored_id):
+    print("\n3. A trial call closes the breaker again...")
+    await asyncio.sleep(BREAKER_RESET_SECONDS)
+    response = await client.post("/ai-analysis/?analysis_type=general", headers=headers)
+    assert response.status_code == 200 and response.json()["analysis_id"] != stored_id
+    stats = (await client.get("/ai-stats")).json()
+    print(f"   transitions: {stats['breaker_transitions']}, rejections: {stats['rejections']}")
+    assert stats["breaker_state"] == "closed"
+    assert stats["breaker_transitions"] == {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+    assert stats["rejections"]["breaker_open"] == 2
+    print("   ✅ Fresh analysis generated and breaker closed")
+
+def check_rate_limiter():
+    print("\n4. Token bucket admits its burst, then rate-limits...")
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    waits = [bucket.reserve(max_wait=1.5) for _ in range(5)]
+    print(f"   waits: {[None if w is None else round(w, 2) for w in waits]}")
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0.9 < waits[3] <= 1.0, "Fourth call should wait for the next token"
+    assert waits[4] is None, "Fifth call would wait about 2s and is rejected"
+    print("   ✅ Burst admitted, then calls spaced at the configured rate")
+
+async def run_checks(app, stub):
+    failures = stub.RequestHandlerClass.failures
+    server, base_url = start_server(app)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            headers = await login(client)
+            stored_id = await check_retries(client, headers, failures)
+            await check_breaker_opens(client, headers, failures, stored_id)
+            await check_breaker_closes(client, headers, stored_id)
+        check_rate_limiter()
+    finally:
+        server.should_exit = True
+        stub.shutdown()
+
+def main():
+    print("🛡️  Testing Gemini retries, circuit breaker and rate limiter against the local stub")
+    print("=" * 50)
+    stub = start_stub()
+    # Read when main is imported, so set before the import below
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ai_resilience_test.db')}",
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{stub.server_port}",
+        "GEMINI_RATE_PER_MINUTE": "6000",
+        "GEMINI_MAX_RETRIES": "2",
+        "GEMINI_RETRY_BASE_SECONDS": "0.05",
+        "GEMINI_BREAKER_FAILURES": str(BREAKER_FAILURES),
+        "GEMINI_BREAKER_RESET_SECONDS": str(BREAKER_RESET_SECONDS),
+    })
+    from main import app
+
+    try:
+        asyncio.run(run_checks(app, stub))
+        print("\n🎉 Gemini calls recover from errors and respect the quota!")
+    except AssertionError as e:
+        print(f"\n❌ AI resilience test failed: {e}")
+        sys.exit(1)
+
+def test_ai_resilience():
+    run_isolated(__file__)
+
+if __name__ == "__main__":
+    main()
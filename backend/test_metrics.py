@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Metrics test - request histograms and phase timings served at /metrics.
+
+Calls the app through TestClient, against a scratch SQLite database and the
+local Gemini stub (gemini_stub.py), then parses the Prometheus text from
+/metrics and verifies that:
+  - requests are counted per route template and status code, with unmatched
+    paths under one label
+  - latency and response size histograms are cumulative and agree with the
+    request counts and the bytes sent
+  - database, Gemini and serialization time are broken out per route
+  - in-flight gauges are back to zero once requests finish
+  - Gemini and cache stats are included
+  - with METRICS_ENABLED=false no middleware is installed and /metrics is 404
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+from fastapi.testclient import TestClient
+
+from gemini_stub import start_stub
+from isolated import run_isolated
+
+SAMPLE = re.compile(r"^(\w+)(?:\{(.*)\})? (\S+)$")
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def parse(text):
+    """{metric name: {frozenset of label pairs: value}}"""
+    samples = defaultdict(dict)
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"Malformed sample line: {line!r}"
+        name, labels, value = match.groups()
+        samples[name][frozenset(LABEL.findall(labels or ""))] = float(value)
+    return samples
+
+def value(samples, name, **labels):
+    return samples[name].get(frozenset(labels.items()))
+
+def check_metrics(app):
+    with TestClient(app) as client:
+        credentials = {"name": "Metrics Test", "email": "metrics-test@example.com", "password": "testpass123"}
+        client.post("/users/", json=credentials)
+        token = client.post("/token", data={"username": credentials["email"], "password": credentials["password"]}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        transaction = {"amount": -120.0, "category": "Food", "description": "Swiggy lunch", "date": "2024-06-02T13:00:00", "payment_method": "UPI"}
+        client.post("/transactions/", headers=headers, json=transaction)
+        summary_bytes = sum(len(client.get("/summary", headers=headers).content) for _ in range(3))
+        assert client.get("/summary").status_code == 401
+        assert client.get("/no-such-page-1").status_code == 404
+        assert client.get("/no-such-page-2").status_code == 404
+        assert client.post("/chat/", headers=headers, json={"content": "How much can I spend today?"}).status_code == 200
+        with client.stream("POST", "/chat/stream", headers=headers, json={"content": "And this week?"}) as response:
+            response.read()
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        samples = parse(response.text)
+
+    assert value(samples, "flexifi_http_requests_total", method="GET", route="/summary", status="200") == 3
+    assert value(samples, "flexifi_http_requests_total", method="GET", route="/summary", status="401") == 1
+    assert value(samples, "flexifi_http_requests_total", method="GET", route="unmatched", status="404") == 2
+    assert not any(dict(labels).get("route", "").startswith("/no-such") for labels in samples["flexifi_http_requests_total"])
+    print("   ✅ Requests counted per route template and status")
+
+    for name in ("flexifi_http_request_duration_seconds", "flexifi_http_response_size_bytes"):
+        buckets = defaultdict(list)
+        for labels, count in samples[f"{name}_bucket"].items():
+            labels = dict(labels)
+            le = labels.pop("le")
+            buckets[frozenset(labels.items())].append((float(le), count))
+        for series, counts in buckets.items():
+            counts = [count for _, count in sorted(counts)]
+            assert counts == sorted(counts), f"{name} buckets are not cumulative for {dict(series)}"
+            assert counts[-1] == samples[f"{name}_count"][series], f"{name} +Inf bucket differs from _count for {dict(series)}"
+    assert value(samples, "flexifi_http_request_duration_seconds_count", method="GET", route="/summary") == 4
+    assert value(samples, "flexifi_http_response_size_bytes_sum", method="GET", route="/summary") >= summary_bytes
+    print("   ✅ Latency and size histograms are consistent")
+
+    phase = "flexifi_http_request_phase_seconds_count"
+    assert value(samples, phase, method="GET", route="/summary", phase="db") == 3
+    assert value(samples, phase, method="GET", route="/summary", phase="serialization") == 3
+    assert value(samples, phase, method="GET", route="/summary", phase="gemini") is None
+    for route in ("/chat/", "/chat/stream"):
+        assert value(samples, phase, method="POST", route=route, phase="gemini") == 1, route
+        assert value(samples, phase, method="POST", route=route, phase="db") == 1, route
+    assert value(samples, "flexifi_db_statements_total", method="GET", route="/summary") >= 3
+    stream_seconds = value(samples, "flexifi_http_request_duration_seconds_sum", method="POST", route="/chat/stream")
+    assert value(samples, "flexifi_http_request_phase_seconds_sum", method="POST", route="/chat/stream", phase="gemini") <= stream_seconds
+    print("   ✅ DB, Gemini and serialization time broken out per route")
+
+    assert value(samples, "flexifi_http_requests_in_flight", method="GET", route="/summary") == 0
+    assert value(samples, "flexifi_http_requests_in_flight", method="GET", route="/metrics") == 1
+    assert value(samples, "flexifi_gemini_breaker_state", state="closed") == 1
+    assert value(samples, "flexifi_cache_hits_total", cache="token_cache") >= 1
+    print("   ✅ In-flight gauges, Gemini and cache stats reported")
+
+    # METRICS_ENABLED is read at import, so check the disabled app in a fresh interpreter
+    check = (
+        "from fastapi.testclient import TestClient\n"
+        "from main import app\n"
+        "import metrics\n"
+        "assert not any(m.cls is metrics.MetricsMiddleware for m in app.user_middleware)\n"
+        "assert not any(isinstance(r, metrics.MetricsRoute) for r in app.routes)\n"
+        "assert TestClient(app).get('/metrics').status_code == 404\n"
+    )
+    env = {**os.environ, "METRICS_ENABLED": "false",
+           "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metrics_disabled.db')}"}
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", check], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, f"Disabled metrics check failed:\n{result.stderr[-1000:]}"
+    print("   ✅ Nothing installed with METRICS_ENABLED=false")
+
+def main():
+    print("📊 Checking request metrics at /metrics")
+    print("=" * 50)
+    stub = start_stub()
+    # Read when main is imported, so set before the import below
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metrics_test.db')}",
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{stub.server_port}",
+        "GEMINI_RATE_PER_MINUTE": "0",
+        "METRICS_ENABLED": "true",
+    })
+    from main import app
+
+    try:
+        check_metrics(app)
+        print("\n🎉 Request metrics are working!")
+    except AssertionError as e:
+        print(f"\n❌ Metrics test failed: {e}")
+        sys.exit(1)
+    finally:
+        stub.shutdown()
+
+def test_metrics():
+    run_isolated(__file__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Query plan test - every endpoint's SQL must use an index, not scan a table.
+
+Seeds a scratch SQLite database with QUERY_PLAN_USERS users, each with
+QUERY_PLAN_TRANSACTIONS transactions plus accounts, budgets, goals, analyses
+and chat messages. It then calls every API route through the app, with Gemini
+answered by the local stub (gemini_stub.py), and records each statement
+sent to the database. Each recorded statement is run again under
+EXPLAIN QUERY PLAN, and the test fails if any of them scans one of the
+app's tables ("SCAN <table>", including full scans of a covering index).
+Routes that the test does not call also fail it, so new endpoints have to be
+added here.
+
+The schema is built by create_all and then upgrade_schema, the same way an
+existing database is migrated at startup. The app's modules are imported
+inside the functions below, once main() has pointed DATABASE_URL at the
+scratch database.
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+from gemini_stub import start_stub
+from isolated import run_isolated
+
+USERS = int(os.getenv("QUERY_PLAN_USERS", "500"))
+TRANSACTIONS = int(os.getenv("QUERY_PLAN_TRANSACTIONS", "200"))
+
+SCAN = re.compile(r"^SCAN (\w+)")
+
+# (route label, statement, parameters) for every statement the app sent
+recorded = []
+current_route = None
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if current_route and not re.match(r"\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA|SAVEPOINT|RELEASE)", statement, re.I):
+        recorded.append((current_route, statement, parameters))
+
+def seed(owner_id):
+    """Bulk-load other users' data, and the test user's, so every table is large"""
+    from database import SessionLocal
+    from models import Account, AIAnalysis, Budget, ChatMessage, SavingsGoal, Transaction, User
+    from money import to_minor
+    from rollups import rebuild_rollups
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"name": f"Plan {i}", "email": f"plan-{i}@example.com", "password_hash": "x"} for i in range(USERS)
+        ])
+        user_ids = [owner_id] + [user.user_id for user in db.query(User.user_id).filter(User.user_id != owner_id)]
+        start = datetime(2024, 1, 1)
+        for user_id in user_ids:
+            db.execute(insert(Transaction), [{
+                "user_id": user_id, "amount_minor": -to_minor(i % 500 + 1) if i % 20 else to_minor(25000),
+                "category": ["Food", "Rent", "Travel", "Shopping"][i % 4] if i % 20 else "Income",
+                "description": f"Merchant {i % 37} payment {i}", "date": start + timedelta(hours=7 * i),
+                "payment_method": "UPI",
+            } for i in range(TRANSACTIONS)])
+            db.execute(insert(Account), [{"user_id": user_id, "account_number": f"{user_id}-{i}", "current_balance_minor": to_minor(1000)} for i in range(2)])
+            db.execute(insert(Budget), [{"user_id": user_id, "monthly_budget_minor": to_minor(30000), "start_date": start, "end_date": start + timedelta(days=30)}])
+            db.execute(insert(SavingsGoal), [{"user_id": user_id, "goal_name": "Trip", "target_amount_minor": to_minor(50000),
+                                              "current_amount_minor": to_minor(100 * i), "deadline": start + timedelta(days=365)} for i in range(3)])
+            db.execute(insert(AIAnalysis), [{"user_id": user_id, "analysis_type": "general", "result": "Old insight",
+                                             "data_fingerprint": f"old-{i}"} for i in range(5)])
+            db.execute(insert(ChatMessage), [{"user_id": user_id, "is_user": i % 2, "content": f"Message {i}",
+                                              "created_at": start + timedelta(minutes=i)} for i in range(40)])
+        rebuild_rollups(db)
+        db.commit()
+    print(f"   Seeded {len(user_ids)} users, {len(user_ids) * TRANSACTIONS:,} transactions in {time.perf_counter() - started:.1f}s")
+
+def call_routes(client, headers):
+    """Call every route, recording the statements sent under each route's label"""
+    global current_route
+    called = set()
+
+    def call(method, path, url=None, **kwargs):
+        global current_route
+        current_route = f"{method} {path}"
+        response = client.request(method, url or path, **kwargs)
+        assert response.status_code < 400, f"{current_route}: {response.status_code} {response.text[:200]}"
+        called.add((method, path))
+        return response
+
+    account_id = call("POST", "/accounts/", headers=headers, json={"account_number": "999", "current_balance": 500.0}).json()["account_id"]
+    call("GET", "/accounts/", headers=headers)
+    call("PUT", "/accounts/{account_id}", f"/accounts/{account_id}?balance=750", headers=headers)
+    call("POST", "/budgets/", headers=headers, json={"monthly_budget": 40000, "start_date": "2024-06-01T00:00:00", "end_date": "2024-06-30T00:00:00"})
+    call("GET", "/budgets/", headers=headers)
+    call("POST", "/savings-goals/", headers=headers, json={"goal_name": "Bike", "target_amount": 90000, "current_amount": 0, "deadline": "2025-01-01T00:00:00"})
+    call("GET", "/savings-goals/", headers=headers)
+
+    transaction = {"amount": -120.0, "category": "Food", "description": "Swiggy lunch", "date": "2024-06-02T13:00:00", "payment_method": "UPI"}
+    call("POST", "/transactions/", headers=headers, json=transaction)
+    call("POST", "/transactions/bulk", headers=headers, json=[transaction] * 3)
+    call("POST", "/transactions/import", "/transactions/import?format=csv", headers={**headers, "Content-Type": "text/csv"},
+         content="Txn Date,Narration,Withdrawal Amt,Deposit Amt,Mode\n01/03/2024,Zomato dinner,450,,UPI\n")
+    page = call("GET", "/transactions/", "/transactions/?limit=20&category=Food&min_amount=-300&direction=debit", headers=headers)
+    call("GET", "/transactions/", f"/transactions/?limit=20&cursor={page.headers['X-Next-Cursor']}", headers=headers)
+    call("GET", "/transactions/", "/transactions/?start_date=2024-02-01T00:00:00&end_date=2024-02-03T00:00:00", headers=headers)
+    call("GET", "/transactions/export", "/transactions/export?format=csv&start_date=2024-02-01T00:00:00", headers=headers)
+    call("GET", "/transactions/search", "/transactions/search?q=merch pay&max_amount=-100", headers=headers)
+    call("GET", "/summary", headers=headers)
+
+    analysis = call("POST", "/ai-analysis/", "/ai-analysis/?analysis_type=general", headers=headers).json()
+    call("POST", "/ai-analysis/", "/ai-analysis/?analysis_type=general", headers=headers)  # Served from the stored analysis
+    job = call("POST", "/ai-analysis/jobs", "/ai-analysis/jobs?analysis_type=budget", headers=headers).json()
+    for _ in range(100):
+        job = call("GET", "/ai-analysis/jobs/{job_id}", f"/ai-analysis/jobs/{job['job_id']}", headers=headers).json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded", job
+    call("GET", "/ai-analysis/", headers=headers)
+    assert analysis["result"]
+
+    call("POST", "/chat/", headers=headers, json={"content": "How much can I spend today?"})
+    call("POST", "/chat/stream", headers=headers, json={"content": "And this week?"})
+    page = call("GET", "/chat/", "/chat/?limit=10", headers=headers)
+    call("GET", "/chat/", f"/chat/?limit=10&cursor={page.headers['X-Next-Cursor']}", headers=headers)
+    call("GET", "/chat/", headers=headers)
+
+    call("GET", "/users/me", headers=headers)
+    call("GET", "/")
+    call("GET", "/cache-stats")
+    call("GET", "/ai-stats")
+    call("GET", "/metrics")
+    current_route = None
+    return called
+
+def scans(statement, parameters):
+    """Table scans in the statement's query plan"""
+    from database import Base, engine
+
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[3] for row in plan if (match := SCAN.match(row[3])) and match.group(1) in Base.metadata.tables]
+
+def check_query_plans(app):
+    from database import async_engine, engine
+
+    # The statement importer writes through the sync engine from a worker thread
+    for target in (async_engine.sync_engine, engine):
+        event.listen(target, "before_cursor_execute", record_statement)
+
+    with TestClient(app) as client:
+        credentials = {"name": "Plan Test", "email": "plan-test@example.com", "password": "testpass123"}
+        owner_id = client.post("/users/", json=credentials).json()["user_id"]
+        seed(owner_id)
+
+        global current_route
+        current_route = "POST /token"
+        token = client.post("/token", data={"username": credentials["email"], "password": credentials["password"]}).json()["access_token"]
+        called = call_routes(client, {"Authorization": f"Bearer {token}"}) | {("POST", "/token")}
+        # The user was created before seeding; sign up once more to record its queries
+        current_route = "POST /users/"
+        client.post("/users/", json={**credentials, "email": "plan-test-2@example.com"})
+        current_route = None
+        called.add(("POST", "/users/"))
+
+    routes = {(method, route.path) for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+    missing = routes - called
+    assert not missing, f"Routes not covered by this test: {sorted(missing)}"
+
+    failures = defaultdict(set)
+    checked = set()
+    for route, statement, parameters in recorded:
+        if statement in checked:
+            continue
+        checked.add(statement)
+        for detail in scans(statement, parameters):
+            failures[route].add(f"{detail}\n      {' '.join(statement.split())[:160]}")
+    print(f"   {len(checked)} distinct statements from {len(called)} routes")
+    for route, details in sorted(failures.items()):
+        print(f"   ❌ {route}")
+        for detail in sorted(details):
+            print(f"      {detail}")
+    assert not failures, f"{sum(len(d) for d in failures.values())} statements scan a table"
+    print("   ✅ Every statement uses an index")
+
+def main():
+    print("🔍 Checking the query plan of every endpoint statement")
+    print("=" * 50)
+    stub = start_stub()
+    # Read when database and main are imported, so set before the import below
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'query_plans.db')}",
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{stub.server_port}",
+        "GEMINI_RATE_PER_MINUTE": "0",
+        "GEMINI_MAX_RETRIES": "0",
+    })
+    from main import app
+
+    try:
+        check_query_plans(app)
+        print("\n🎉 No endpoint query scans a table!")
+    except AssertionError as e:
+        print(f"\n❌ Query plan test failed: {e}")
+        sys.exit(1)
+    finally:
+        stub.shutdown()
+
+def test_query_plans():
+    run_isolated(__file__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Cache of the authenticated-user projection so protected requests can skip the
+users table lookup.
+
+Entries are keyed by (user_id, token id) and hold a UserResponse. Every user
+has a generation counter; an update or delete of a User row bumps it once the
+transaction commits, which invalidates all of that user's entries at once.
+In-process generations are kept for the USER_CACHE_MAX_ENTRIES most recently
+changed users; forgetting one raises the generation every other user starts
+from, so entries cached before the forgotten change stay invalid.
+
+By default the cache lives in-process. Set USER_CACHE_REDIS_URL (and install
+redis) to share entries and generations between workers, so a deactivation
+seen by one worker is honoured by all of them.
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from cache import CacheStats, TTLCache
+from models import User, UserResponse
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:  # The shared backend is optional
+    redis = None
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL", "")
+
+class LocalUserCache:
+    """Per-process LRU of user projections"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.stats = CacheStats()
+        self._entries = TTLCache(maxsize, ttl, self.stats)
+        self._maxsize = maxsize
+        # user_id -> generation, least recently changed first. Generations come
+        # from one counter, so they only grow, even for a user forgotten and
+        # changed again.
+        self._generations = OrderedDict()
+        self._counter = 0
+        # Generation of users not in _generations: the highest one forgotten
+        self._floor = 0
+
+    def _generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, self._floor)
+
+    async def get(self, user_id: int, token_id: str):
+        """Return (user or None, generation); pass the generation back to set() on a miss"""
+        generation = self._generation(user_id)
+        entry = self._entries.get((user_id, token_id))
+        if entry is not None and entry[0] == generation:
+            return entry[1], generation
+        return None, generation
+
+    async def set(self, user_id: int, token_id: str, user: UserResponse, generation: int):
+        if self._generation(user_id) == generation:
+            self._entries.set((user_id, token_id), (generation, user))
+
+    def invalidate(self, user_id: int):
+        self._counter += 1
+        self._generations[user_id] = self._counter
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self._maxsize:
+            _, forgotten = self._generations.popitem(last=False)
+            self._floor = max(self._floor, forgotten)
+
+    def clear(self):
+        self._entries.clear()
+        self._generations.clear()
+        self._counter = self._floor = 0
+
+class RedisUserCache:
+    """User projections and generations stored in Redis, shared by all workers"""
+
+    def __init__(self, url: str, ttl: float):
+        self.stats = CacheStats()
+        self.ttl = max(1, int(ttl))
+        self._client = redis_asyncio.from_url(url)
+        # For invalidations from scripts and worker threads, where no event loop runs
+        self._sync_client = redis.from_url(url)
+        # Invalidations scheduled on the event loop, referenced until they finish
+        self._pending = set()
+
+    @staticmethod
+    def _keys(user_id: int, token_id: str = ""):
+        return f"flexifi:user:{user_id}:{token_id}", f"flexifi:user-generation:{user_id}"
+
+    async def get(self, user_id: int, token_id: str):
+        entry_key, generation_key = self._keys(user_id, token_id)
+        entry, generation = await self._client.mget(entry_key, generation_key)
+        generation = int(generation or 0)
+        if entry is not None:
+            data = json.loads(entry)
+            if data["generation"] == generation:
+                return UserResponse.model_validate(data["user"]), generation
+        return None, generation
+
+    async def set(self, user_id: int, token_id: str, user: UserResponse, generation: int):
+        entry_key, _ = self._keys(user_id, token_id)
+        payload = json.dumps({"generation": generation, "user": user.model_dump(mode="json")})
+        await self._client.set(entry_key, payload, ex=self.ttl)
+
+    def invalidate(self, user_id: int):
+        """Bump the user's generation without blocking the event loop.
+
+        The after_commit hook calling this runs on the event loop when the
+        session is an AsyncSession, so there the async client's INCR is
+        scheduled as a task; elsewhere the sync client is used.
+        """
+        _, generation_key = self._keys(user_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._sync_client.incr(generation_key)
+            return
+        task = loop.create_task(self._client.incr(generation_key))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def clear(self):
+        for key in self._sync_client.scan_iter("flexifi:user*"):
+            self._sync_client.delete(key)
+
+def create_user_cache():
+    if USER_CACHE_REDIS_URL:
+        if redis is None:
+            print("⚠️  USER_CACHE_REDIS_URL is set but redis is not installed; using the in-process user cache")
+        else:
+            return RedisUserCache(USER_CACHE_REDIS_URL, USER_CACHE_TTL_SECONDS)
+    return LocalUserCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+
+user_cache = create_user_cache()
+
+# Invalidate after commit rather than at flush: a request reading the old row
+# between the two would otherwise re-cache it under the new generation.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.user_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
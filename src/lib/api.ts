@@ -154,6 +154,20 @@ export const budgetApi = {
   },
 };
 
+// Download the user's transactions as a file (csv, ndjson, parquet or arrow)
+export const exportTransactions = async (format: string = 'csv'): Promise<Blob> => {
+  const token = getToken();
+  const response = await fetch(`${API_BASE_URL}/transactions/export?format=${format}`, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+  });
+  
+  if (!response.ok) {
+    throw new Error(`Error ${response.status}: ${response.statusText}`);
+  }
+  
+  return response.blob();
+};
+
 // Transaction API
 export const transactionApi = {
   // Create a new transaction
@@ -170,9 +184,84 @@ export const transactionApi = {
     });
   },
   
-  // Get all transactions for current user
-  getTransactions: async () => {
-    return await fetchWithAuth('/transactions/');
+  // Create many transactions in one request
+  createTransactionsBulk: async (transactions: Array<{
+    amount: number;
+    category: string;
+    description: string;
+    date: string;
+    payment_method: string;
+  }>) => {
+    return await fetchWithAuth('/transactions/bulk', {
+      method: 'POST',
+      body: JSON.stringify(transactions),
+    });
+  },
+  
+  // Import a CSV or NDJSON bank statement; rows already imported are skipped
+  importStatement: async (file: File, format: 'csv' | 'ndjson' = 'csv') => {
+    return await fetchWithAuth(`/transactions/import?format=${format}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson',
+      },
+      body: file,
+    });
+  },
+  
+  // Export all transactions for current user
+  exportTransactions,
+  
+  // Get transactions for current user, optionally filtered and paged
+  getTransactions: async (params: Record<string, string | number> = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).map(([key, value]) => [key, String(value)])
+    ).toString();
+    return await fetchWithAuth(`/transactions/${query ? `?${query}` : ''}`);
+  },
+  
+  // Get one page of transactions, newest first. nextCursor fetches the page
+  // after it and is null once the oldest matching transaction is reached.
+  getTransactionsPage: async (
+    limit: number,
+    cursor?: string | null,
+    params: Record<string, string | number> = {}
+  ) => {
+    const token = getToken();
+    const query = new URLSearchParams(
+      Object.entries({ ...params, limit }).map(([key, value]) => [key, String(value)])
+    );
+    if (cursor) {
+      query.set('cursor', cursor);
+    }
+    const response = await fetch(`${API_BASE_URL}/transactions/?${query}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    
+    if (!response.ok) {
+      throw new Error(`Error ${response.status}: ${response.statusText}`);
+    }
+    
+    return {
+      transactions: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor'),
+    };
+  },
+  
+  // Search descriptions and categories by word prefixes, best matches first
+  searchTransactions: async (q: string, params: Record<string, string | number> = {}) => {
+    const query = new URLSearchParams(
+      Object.entries({ q, ...params }).map(([key, value]) => [key, String(value)])
+    ).toString();
+    return await fetchWithAuth(`/transactions/search?${query}`);
+  },
+};
+
+// Dashboard summary API
+export const summaryApi = {
+  // Get aggregated totals for the dashboard
+  getSummary: async () => {
+    return await fetchWithAuth('/summary');
   },
 };
 
@@ -206,6 +295,31 @@ export const aiAnalysisApi = {
     });
   },
   
+  // Queue an analysis in the background; returns the job
+  enqueueAnalysis: async (analysisType: string = 'general') => {
+    return await fetchWithAuth(`/ai-analysis/jobs?analysis_type=${analysisType}`, {
+      method: 'POST',
+    });
+  },
+  
+  // Get the status of a queued analysis (includes the analysis once it succeeded)
+  getAnalysisJob: async (jobId: number) => {
+    return await fetchWithAuth(`/ai-analysis/jobs/${jobId}`);
+  },
+  
+  // Queue an analysis and poll until it finishes, resolving to the analysis
+  runAnalysisJob: async (analysisType: string = 'general', pollMs: number = 1500) => {
+    let job = await aiAnalysisApi.enqueueAnalysis(analysisType);
+    while (job.status === 'pending' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, pollMs));
+      job = await aiAnalysisApi.getAnalysisJob(job.job_id);
+    }
+    if (job.status !== 'succeeded') {
+      throw new Error(job.error || 'Analysis failed');
+    }
+    return job.analysis;
+  },
+  
   // Get all previous AI analyses
   getAnalyses: async () => {
     return await fetchWithAuth('/ai-analysis/');
@@ -222,10 +336,76 @@ export const chatApi = {
     });
   },
   
+  // Send a message and receive the AI response as it is generated.
+  // onToken is called with each piece of text; resolves to the saved message.
+  streamMessage: async (content: string, onToken: (text: string) => void) => {
+    const token = getToken();
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ content }),
+    });
+    
+    if (!response.ok || !response.body) {
+      throw new Error(`Error ${response.status}: ${response.statusText}`);
+    }
+    
+    // Parse Server-Sent Events: "event: <name>\ndata: <json>\n\n"
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let saved = null;
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop() || '';
+      for (const block of events) {
+        const event = block.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] || 'null');
+        if (event === 'token') {
+          onToken(data.text);
+        } else if (event === 'done') {
+          saved = data;
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
+      }
+    }
+    return saved;
+  },
+  
   // Get chat history
   getChatHistory: async () => {
     return await fetchWithAuth('/chat/');
   },
+  
+  // Get one page of chat history, oldest first within the page. Without a
+  // cursor this is the newest page; nextCursor fetches the one before it and
+  // is null once the start of the conversation is reached.
+  getChatHistoryPage: async (limit: number, cursor?: string | null) => {
+    const token = getToken();
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const response = await fetch(`${API_BASE_URL}/chat/?${params}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    
+    if (!response.ok) {
+      throw new Error(`Error ${response.status}: ${response.statusText}`);
+    }
+    
+    return {
+      messages: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor'),
+    };
+  },
 };
 
 // Export all APIs
@@ -234,6 +414,7 @@ export const api = {
   account: accountApi,
   budget: budgetApi,
   transaction: transactionApi,
+  summary: summaryApi,
   savingsGoal: savingsGoalApi,
   aiAnalysis: aiAnalysisApi,
   chat: chatApi,
@@ -62,7 +62,8 @@ const AIAnalysis: React.FC = () => {
     try {
       setLoading(true);
       setError(null);
-      const newAnalysis = await api.aiAnalysis.generateAnalysis(analysisType);
+      // Generated in the background, so slow responses don't time out the request
+      const newAnalysis = await api.aiAnalysis.runAnalysisJob(analysisType);
       
       // Check if the result contains an error message about API key
       if (newAnalysis.result && (
@@ -73,7 +74,8 @@ const AIAnalysis: React.FC = () => {
         return;
       }
       
-      setAnalyses(prev => [newAnalysis, ...prev]);
+      // A reused analysis may already be listed
+      setAnalyses(prev => [newAnalysis, ...prev.filter(a => a.analysis_id !== newAnalysis.analysis_id)]);
     } catch (err: any) {
       console.error('Error generating analysis:', err);
       if (err.message && err.message.includes("API key")) {
@@ -14,12 +14,26 @@ interface ChatMessage {
   created_at: string;
 }
 
+// Messages loaded at a time; older ones are fetched on request
+const CHAT_PAGE_SIZE = 50;
+
+// Ids for messages not saved yet; negative so they never match a server id or each other
+let nextTemporaryId = -1;
+
+// Saved fallback replies from when the API key was missing or invalid
+const isApiKeyError = (message: ChatMessage) =>
+  message.content.includes("API key not configured") ||
+  message.content.includes("Error processing message") ||
+  message.content.includes("AI service unavailable");
+
 const Chat: React.FC = () => {
   const navigate = useNavigate();
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [newMessage, setNewMessage] = useState<string>('');
   const [loading, setLoading] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState<boolean>(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   // Fetch chat history on component mount
@@ -27,33 +41,28 @@ const Chat: React.FC = () => {
     fetchChatHistory();
   }, []);
 
-  // Scroll to bottom when messages change
+  // Scroll to bottom when a message is added or streams in, but not when older ones are loaded
+  const lastMessage = messages[messages.length - 1];
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [lastMessage?.message_id, lastMessage?.content]);
 
   // Fetch chat history from API
   const fetchChatHistory = async () => {
     try {
       setLoading(true);
       setError(null);
-      const data = await api.chat.getChatHistory();
+      const page = await api.chat.getChatHistoryPage(CHAT_PAGE_SIZE);
+      const data: ChatMessage[] = page.messages;
       
       // Filter out messages with API key errors
-      const validMessages = data.filter(message => 
-        !(message.content.includes("API key not configured") ||
-          message.content.includes("Error processing message") ||
-          message.content.includes("AI service unavailable"))
-      );
+      const validMessages = data.filter(message => !isApiKeyError(message));
       
       setMessages(validMessages);
+      setOlderCursor(page.nextCursor);
       
       // If we have messages with errors, show a message
-      if (data.length > 0 && data.some(message => 
-          message.content.includes("API key not configured") ||
-          message.content.includes("Error processing message") ||
-          message.content.includes("AI service unavailable")
-        )) {
+      if (data.length > 0 && data.some(isApiKeyError)) {
         setError('AI chatbot unavailable: The API key may be invalid or missing. Please contact support.');
       }
     } catch (err: any) {
@@ -68,10 +77,29 @@ const Chat: React.FC = () => {
     }
   };
 
+  // Prepend the page of messages before the oldest one shown
+  const loadOlderMessages = async () => {
+    if (!olderCursor) return;
+    try {
+      setLoadingOlder(true);
+      const page = await api.chat.getChatHistoryPage(CHAT_PAGE_SIZE, olderCursor);
+      const older: ChatMessage[] = page.messages.filter((message: ChatMessage) => !isApiKeyError(message));
+      setMessages(prev => [...older, ...prev]);
+      setOlderCursor(page.nextCursor);
+    } catch (err: any) {
+      console.error('Error fetching older messages:', err);
+      setError('Failed to load earlier messages. Please try again later.');
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   // Send a new message
   const sendMessage = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!newMessage.trim()) return;
+    const userMessageId = nextTemporaryId--;
+    const draftId = nextTemporaryId--;
 
     try {
       setLoading(true);
@@ -79,7 +107,7 @@ const Chat: React.FC = () => {
       
       // Optimistically add user message to UI
       const tempUserMessage: ChatMessage = {
-        message_id: Date.now(), // Temporary ID
+        message_id: userMessageId,
         user_id: 0, // Will be replaced by actual user_id
         is_user: 1,
         content: newMessage,
@@ -89,15 +117,26 @@ const Chat: React.FC = () => {
       setMessages(prev => [...prev, tempUserMessage]);
       setNewMessage('');
       
-      // Send message to API and get AI response
-      const response = await api.chat.sendMessage(newMessage);
+      // Show the AI response as it streams in, then replace it with the saved message
+      setMessages(prev => [...prev, {
+        message_id: draftId,
+        user_id: 0,
+        is_user: 0,
+        content: '',
+        created_at: new Date().toISOString(),
+      }]);
+      const response = await api.chat.streamMessage(newMessage, (text) => {
+        setMessages(prev => prev.map(msg =>
+          msg.message_id === draftId ? { ...msg, content: msg.content + text } : msg
+        ));
+      });
+      setMessages(prev => prev.filter(msg => msg.message_id !== draftId));
+      if (!response) {
+        throw new Error('The response stream ended early');
+      }
       
       // Check if the response contains an error message about API key
-      if (response.content && (
-          response.content.includes("API key not configured") ||
-          response.content.includes("Error processing message") ||
-          response.content.includes("AI service unavailable")
-        )) {
+      if (isApiKeyError(response)) {
         setError("AI chatbot unavailable: The API key may be invalid or missing. Please contact support.");
         // Remove the error message from the chat
         setMessages(prev => prev.filter(msg => msg.message_id !== response.message_id));
@@ -108,6 +147,7 @@ const Chat: React.FC = () => {
       setMessages(prev => [...prev, response]);
     } catch (err: any) {
       console.error('Error sending message:', err);
+      setMessages(prev => prev.filter(msg => msg.message_id !== draftId));
       if (err.message && err.message.includes("API key")) {
         setError('AI chatbot unavailable: API key configuration issue. Please contact support.');
       } else {
@@ -158,6 +198,13 @@ const Chat: React.FC = () => {
 
           {/* Chat messages */}
           <div className="flex-1 overflow-y-auto mb-4 space-y-4">
+            {olderCursor && (
+              <div className="text-center">
+                <Button variant="ghost" size="sm" onClick={loadOlderMessages} disabled={loadingOlder}>
+                  {loadingOlder ? 'Loading...' : 'Load earlier messages'}
+                </Button>
+              </div>
+            )}
             {messages.length === 0 && !loading ? (
               <div className="text-center py-12">
                 <p className="text-gray-500">No messages yet. Start a conversation!</p>
@@ -50,10 +50,6 @@ const Dashboard = () => {
   const [financialData, setFinancialData] = useState(mockFinancialData);
   const [isLoading, setIsLoading] = useState(false);
   const [isBudgetModalOpen, setIsBudgetModalOpen] = useState(false);
-  const [accounts, setAccounts] = useState<any[]>([]);
-  const [budgets, setBudgets] = useState<any[]>([]);
-  const [transactions, setTransactions] = useState<any[]>([]);
-  const [savingsGoals, setSavingsGoals] = useState<any[]>([]);
 
   useEffect(() => {
     const userData = localStorage.getItem("flexifi_user");
@@ -69,71 +65,23 @@ const Dashboard = () => {
   const fetchFinancialData = async () => {
     setIsLoading(true);
     try {
-      // Fetch all data in parallel
-      const [accountsData, budgetsData, transactionsData, savingsGoalsData] = await Promise.all([
-        api.account.getAccounts(),
-        api.budget.getBudgets(),
-        api.transaction.getTransactions(),
-        api.savingsGoal.getSavingsGoals()
-      ]);
+      // Totals are aggregated server-side in a single request
+      const summary = await api.summary.getSummary();
 
-      setAccounts(accountsData);
-      setBudgets(budgetsData);
-      setTransactions(transactionsData);
-      setSavingsGoals(savingsGoalsData);
-
-      // Calculate financial data from real data
       // Income includes positive transactions; if no transactions present yet, seed from accounts current balance
-      let totalIncome = transactionsData
-        .filter(t => t.amount > 0)
-        .reduce((sum, t) => sum + t.amount, 0);
-      if (totalIncome === 0 && accountsData && accountsData.length > 0) {
-        // Use the first account's balance as starting income snapshot
-        totalIncome = accountsData.reduce((sum: number, a: any) => sum + (a.current_balance || 0), 0);
+      let totalIncome = summary.income;
+      if (totalIncome === 0 && summary.account_count > 0) {
+        // Use the accounts' balance as starting income snapshot
+        totalIncome = summary.account_balance;
       }
-      
-      const totalExpenses = Math.abs(transactionsData
-        .filter(t => t.amount < 0)
-        .reduce((sum, t) => sum + t.amount, 0));
-      
-      // Use the most recently created/active budget instead of summing or the first item
-      let currentBudget = 0;
-      if (budgetsData && budgetsData.length > 0) {
-        const sortedByCreated = [...budgetsData].sort((a: any, b: any) => {
-          const ad = a.created_at ? new Date(a.created_at).getTime() : 0;
-          const bd = b.created_at ? new Date(b.created_at).getTime() : 0;
-          return bd - ad; // newest first
-        });
-        currentBudget = sortedByCreated[0]?.monthly_budget || 0;
-      }
-      const totalSavings = savingsGoalsData
-        .reduce((sum, goal) => sum + goal.current_amount, 0);
-      const totalSavingsGoal = savingsGoalsData
-        .reduce((sum, goal) => sum + goal.target_amount, 0);
-
-      // Calculate expense categories
-      const expenseCategories = transactionsData
-        .filter(t => t.amount < 0)
-        .reduce((acc, t) => {
-          const category = t.category;
-          if (!acc[category]) {
-            acc[category] = 0;
-          }
-          acc[category] += Math.abs(t.amount);
-          return acc;
-        }, {} as Record<string, number>);
-
-      const expenseCategoriesArray = Object.entries(expenseCategories)
-        .map(([name, amount]) => ({ name, amount }))
-        .sort((a, b) => b.amount - a.amount);
 
       setFinancialData({
         income: totalIncome,
-        expenses: totalExpenses,
-        budget: currentBudget,
-        savings: totalSavings,
-        savingsGoal: totalSavingsGoal || 20000, // Default goal if none set
-        expenseCategories: expenseCategoriesArray,
+        expenses: summary.expenses,
+        budget: summary.budget || 0,
+        savings: summary.savings,
+        savingsGoal: summary.savings_goal || 20000, // Default goal if none set
+        expenseCategories: summary.expense_categories,
         monthlyTransactions: [] // Could be calculated from transactions by month
       });
 
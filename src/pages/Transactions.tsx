@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { ArrowLeft, Search, Filter, Download, Calendar, Plus } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -7,6 +7,28 @@ import { useNavigate } from "react-router-dom";
 import api from "../lib/api";
 import { useToast } from "@/hooks/use-toast";
 
+const SEARCH_DEBOUNCE_MS = 250;
+const TRANSACTIONS_PAGE_SIZE = 50;
+
+// Local midnight as the naive ISO datetime the API compares dates against
+const startOfDay = (date: Date) =>
+  `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, "0")}-${String(date.getDate()).padStart(2, "0")}T00:00:00`;
+
+// Query params for the type and date filters, applied on the server
+const filterParams = (filterType: string, dateFilter: string) => {
+  const params: Record<string, string> = {};
+  if (filterType === "payment") params.direction = "debit";
+  if (filterType === "credit") params.direction = "credit";
+  if (filterType === "transfer") params.category = "Transfer";
+  if (dateFilter !== "all") {
+    const start = new Date();
+    if (dateFilter === "week") start.setDate(start.getDate() - ((start.getDay() + 6) % 7)); // Monday
+    if (dateFilter === "month") start.setDate(1);
+    params.start_date = startOfDay(start);
+  }
+  return params;
+};
+
 const Transactions = () => {
   const navigate = useNavigate();
   const { toast } = useToast();
@@ -14,18 +36,58 @@ const Transactions = () => {
   const [filterType, setFilterType] = useState("all");
   const [dateFilter, setDateFilter] = useState("all");
   const [transactions, setTransactions] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [searchResults, setSearchResults] = useState<any[] | null>(null);
+  // Responses to requests made before the filters last changed are dropped
+  const fetchGeneration = useRef(0);
 
-  // Fetch transactions from backend
+  // Fetch the first page whenever the filters change
   useEffect(() => {
     fetchTransactions();
-  }, []);
+  }, [filterType, dateFilter]);
 
-  const fetchTransactions = async () => {
+  // Search on the server once typing pauses
+  useEffect(() => {
+    const query = searchTerm.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const data = await api.transaction.searchTransactions(query, {
+          limit: 100,
+          ...filterParams(filterType, dateFilter),
+        });
+        if (!cancelled) setSearchResults(data);
+      } catch (error) {
+        console.error("Error searching transactions:", error);
+      }
+    }, SEARCH_DEBOUNCE_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, filterType, dateFilter]);
+
+  // Fetch the first page, or with a cursor the page after the ones already shown
+  const fetchTransactions = async (cursor: string | null = null) => {
+    const generation = cursor ? fetchGeneration.current : ++fetchGeneration.current;
+    const setBusy = cursor ? setLoadingMore : setLoading;
+    if (!cursor) setLoadingMore(false);
     try {
-      setLoading(true);
-      const data = await api.transaction.getTransactions();
-      setTransactions(data);
+      setBusy(true);
+      const page = await api.transaction.getTransactionsPage(
+        TRANSACTIONS_PAGE_SIZE,
+        cursor,
+        filterParams(filterType, dateFilter)
+      );
+      if (generation !== fetchGeneration.current) return;
+      setTransactions(previous => cursor ? [...previous, ...page.transactions] : page.transactions);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error("Error fetching transactions:", error);
       toast({
@@ -34,18 +96,30 @@ const Transactions = () => {
         variant: "destructive"
       });
     } finally {
-      setLoading(false);
+      if (generation === fetchGeneration.current) setBusy(false);
     }
   };
 
-  const filteredTransactions = transactions.filter(transaction => {
-    const matchesSearch = transaction.description.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         transaction.category.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesType = filterType === "all" || 
-                       (filterType === "payment" && transaction.amount < 0) ||
-                       (filterType === "credit" && transaction.amount > 0);
-    return matchesSearch && matchesType;
-  });
+  const handleExport = async () => {
+    try {
+      const blob = await api.transaction.exportTransactions("csv");
+      const url = URL.createObjectURL(blob);
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = "transactions.csv";
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error("Error exporting transactions:", error);
+      toast({
+        title: "Error",
+        description: "Failed to export transactions. Please try again.",
+        variant: "destructive"
+      });
+    }
+  };
+
+  const filteredTransactions = searchResults ?? transactions;
 
   const getStatusColor = () => {
     return "text-success"; // All transactions are completed
@@ -87,6 +161,7 @@ const Transactions = () => {
                 variant="ghost" 
                 size="sm"
                 className="text-white hover:bg-white/10"
+                onClick={handleExport}
               >
                 <Download className="w-4 h-4 mr-2" />
                 Export
@@ -189,7 +264,7 @@ const Transactions = () => {
             ))}
           </div>
 
-          {filteredTransactions.length === 0 && (
+          {!loading && filteredTransactions.length === 0 && (
             <div className="finance-card text-center py-12">
               <div className="w-16 h-16 bg-muted rounded-full flex items-center justify-center mx-auto mb-4">
                 <Search className="w-8 h-8 text-muted-foreground" />
@@ -202,10 +277,15 @@ const Transactions = () => {
           )}
 
           {/* Load More */}
-          {filteredTransactions.length > 0 && (
+          {!loading && searchResults === null && nextCursor && (
             <div className="text-center mt-8">
-              <Button variant="outline" className="btn-secondary">
-                Load More Transactions
+              <Button
+                variant="outline"
+                className="btn-secondary"
+                disabled={loadingMore}
+                onClick={() => fetchTransactions(nextCursor)}
+              >
+                {loadingMore ? "Loading..." : "Load More Transactions"}
               </Button>
             </div>
           )}